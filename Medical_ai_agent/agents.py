@@ -6,29 +6,220 @@
 ╚══════════════════════════════════════════════════════════════╝
 """
 
-import os
 import json
-from typing import Any, Dict, List, Optional
+import time
+import atexit
+import asyncio
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache, partial
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+from string import Template
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 
 from config import (
     OPENAI_API_KEY, LLM_MODEL, AGENT_TEMPERATURE,
-    MAX_TOKENS, VERBOSE_AGENTS
+    MAX_TOKENS, VERBOSE_AGENTS, MAX_PARALLEL_AGENTS,
+    TOOL_CONCURRENCY_LIMIT, QUERY_CACHE_CONFIG,
+    REDIS_URL, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIZE, ENTREZ_EMAIL, ENTREZ_API_KEY,
+    EARLY_EXIT_CONFIDENCE, CONFIDENT_MAX_ITER, AGENT_TRACE_LOG
 )
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+_TASK_NAMES = ("diagnosis", "prognosis", "lifestyle", "medication")
+
+
+# ──────────────────────────────────────────────────────────────
+# Parallel Tool Execution
+# ──────────────────────────────────────────────────────────────
+
+class ParallelToolExecutor:
+    """
+    Runs a batch of I/O-bound tool calls concurrently.
+    Results are returned in call order regardless of completion order.
+    """
+
+    def __init__(self, max_workers: int = TOOL_CONCURRENCY_LIMIT):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="medai-tool")
+
+    def run(self, calls: List[Tuple[Callable[[str], str], str]]) -> List[str]:
+        futures = {self._pool.submit(func, arg): i for i, (func, arg) in enumerate(calls)}
+        results = [""] * len(calls)
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+        return results
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+# ──────────────────────────────────────────────────────────────
+# PubMed (NCBI Entrez) Access
+# ──────────────────────────────────────────────────────────────
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per `per` seconds."""
+
+    def __init__(self, rate: float, per: float = 1.0):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.per / self.rate
+            time.sleep(wait)
+
+
+_PUBMED_LIMITER = RateLimiter(10 if ENTREZ_API_KEY else 3)
+_PUBMED_MAX_RETRIES = 4
+_PUBMED_RETMAX = 5
+_ESEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+
+
+def _iter_esearch_ids(chunks, limit: int):
+    """Stream <Id> values out of esearch XML byte chunks, stopping after `limit`."""
+    import xml.etree.ElementTree as ET
+
+    parser = ET.XMLPullParser(events=("end",))
+    seen = 0
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, elem in parser.read_events():
+            if elem.tag == "Id" and elem.text:
+                yield elem.text.strip()
+                seen += 1
+                if seen >= limit:
+                    return
+            elem.clear()
+
+
+def _read_chunks(handle, size: int = 8192):
+    while True:
+        chunk = handle.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _esearch_ids(query: str) -> Tuple[str, ...]:
+    """One esearch request, over the shared HTTP client when available."""
+    from clients import get_http_client
+
+    client = get_http_client()
+    if client is None:
+        from Bio import Entrez
+        Entrez.email = ENTREZ_EMAIL
+        if ENTREZ_API_KEY:
+            Entrez.api_key = ENTREZ_API_KEY
+        handle = Entrez.esearch(db="pubmed", term=query, retmax=_PUBMED_RETMAX)
+        try:
+            return tuple(_iter_esearch_ids(_read_chunks(handle), _PUBMED_RETMAX))
+        finally:
+            handle.close()
+
+    params = {"db": "pubmed", "term": query, "retmax": _PUBMED_RETMAX,
+              "tool": "medical-ai-agent", "email": ENTREZ_EMAIL}
+    if ENTREZ_API_KEY:
+        params["api_key"] = ENTREZ_API_KEY
+    with client.stream("GET", _ESEARCH_URL, params=params) as response:
+        response.raise_for_status()
+        return tuple(_iter_esearch_ids(response.iter_bytes(), _PUBMED_RETMAX))
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    status = getattr(error, "code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429
+
+
+@lru_cache(maxsize=1024)
+def _pubmed_ids(query: str) -> Tuple[str, ...]:
+    """PubMed IDs for a query; rate limited, retried on HTTP 429, memoized."""
+    for attempt in range(_PUBMED_MAX_RETRIES):
+        _PUBMED_LIMITER.acquire()
+        try:
+            return _esearch_ids(query)
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == _PUBMED_MAX_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+    return ()
+
 
 # ──────────────────────────────────────────────────────────────
 # Tool Definitions (used by all agents)
 # ──────────────────────────────────────────────────────────────
 
+_TOOLS_CACHE: "OrderedDict[Tuple[int, int], Tuple[Any, Any, List[Any]]]" = OrderedDict()
+_TOOLS_CACHE_SIZE = 8
+_TOOLS_LOCK = threading.Lock()
+
+
 def build_tools(retriever, graph_engine):
-    """Build LangChain tools wrapping retriever + graph engine."""
+    """
+    Build LangChain tools wrapping retriever + graph engine.
+    Memoized per (retriever, graph_engine) pair so warm requests reuse the
+    tools along with their query cache and thread pool.
+    """
+    key = (id(retriever), id(graph_engine))
+    with _TOOLS_LOCK:
+        cached = _TOOLS_CACHE.get(key)
+        # Entries hold references to both objects, so ids can't be recycled
+        if cached is None:
+            cached = (retriever, graph_engine, _build_tools(retriever, graph_engine))
+            _TOOLS_CACHE[key] = cached
+            while len(_TOOLS_CACHE) > _TOOLS_CACHE_SIZE:
+                _TOOLS_CACHE.popitem(last=False)
+        else:
+            _TOOLS_CACHE.move_to_end(key)
+    return cached[2]
+
+
+def _build_tools(retriever, graph_engine):
     from langchain.tools import Tool
+    from retriever import QueryCache, SearchBatcher, get_embedder, get_local_index
+
+    executor = ParallelToolExecutor()
+    # Query cache and batcher share one embedder so each query is embedded once
+    embedder = get_embedder(retriever)
+    batcher = SearchBatcher(retriever, embedder=embedder)
+    query_cache = QueryCache(
+        embed_fn=embedder.embed_query if embedder else None, **QUERY_CACHE_CONFIG
+    )
+    # DrugBank is static - serve it from the local sqlite-vec mirror when built
+    local_drug_index = get_local_index("drugbank") if embedder else None
 
     def vector_search(query: str) -> str:
         """Search Pinecone vector store for similar medical knowledge."""
+        cached = query_cache.get(query, namespace="vector")
+        if cached is not None:
+            return cached
         try:
-            results = retriever.similarity_search(query, k=5)
-            return "\n---\n".join([r.page_content for r in results])
+            results = batcher.search(query, k=5)
+            text = "\n---\n".join([r.page_content for r in results])
+            query_cache.put(query, text, namespace="vector")
+            return text
         except Exception as e:
             return f"Vector search error: {e}"
 
@@ -43,29 +234,58 @@ def build_tools(retriever, graph_engine):
     def pubmed_search(query: str) -> str:
         """Search PubMed for recent research on the topic."""
         try:
-            # In production: use Entrez API / Biopython
-            # For now returns stub - replace with real Entrez call
-            from Bio import Entrez
-            Entrez.email = os.getenv("ENTREZ_EMAIL", "test@test.com")
-            handle = Entrez.esearch(db="pubmed", term=query, retmax=5)
-            record = Entrez.read(handle)
-            return f"PubMed IDs found: {record['IdList']}"
+            ids = _pubmed_ids(" ".join(query.split()))
+            return f"PubMed IDs found: {list(ids)}"
+        except ImportError as e:
+            return f"PubMed search unavailable (install httpx or biopython): {e}"
         except Exception as e:
-            return f"PubMed search unavailable (install biopython): {e}"
+            return f"PubMed search failed: {e}"
 
     def drugbank_lookup(drug_name: str) -> str:
         """Look up drug information from DrugBank index."""
+        cached = query_cache.get(drug_name, namespace="drug")
+        if cached is not None:
+            return cached
         try:
-            results = retriever.similarity_search(f"drug:{drug_name} mechanism dosage side effects", k=3)
-            return "\n".join([r.page_content for r in results])
+            query = f"drug:{drug_name} mechanism dosage side effects"
+            if local_drug_index is not None:
+                results = local_drug_index.search_by_vector(embedder.embed_query(query), k=3)
+            else:
+                results = batcher.search(query, k=3)
+            text = "\n".join([r.page_content for r in results])
+            query_cache.put(drug_name, text, namespace="drug")
+            return text
         except Exception as e:
             return f"Drug lookup error: {e}"
 
+    multi_prefixes = {
+        "vector": vector_search,
+        "graph": graph_query,
+        "pubmed": pubmed_search,
+        "drug": drugbank_lookup,
+    }
+
+    def multi_search(queries: str) -> str:
+        """Run several lookups concurrently, one `<source>: <query>` per line."""
+        calls, labels = [], []
+        for line in queries.splitlines():
+            prefix, sep, query = line.partition(":")
+            func = multi_prefixes.get(prefix.strip().lower())
+            if not sep or func is None or not query.strip():
+                continue
+            calls.append((func, query.strip()))
+            labels.append(line.strip())
+        if not calls:
+            return "No valid queries. Use one `vector|graph|pubmed|drug: <query>` per line."
+        results = executor.run(calls)
+        return "\n\n".join(f"### {label}\n{result}" for label, result in zip(labels, results))
+
     return [
         Tool(name="medical_vector_search",    func=vector_search,   description="Search medical knowledge base for conditions, treatments, guidelines."),
         Tool(name="medical_graph_query",       func=graph_query,     description="Query Neo4j knowledge graph for disease-drug-gene-symptom relationships."),
         Tool(name="pubmed_research_search",    func=pubmed_search,   description="Search PubMed for the latest peer-reviewed research."),
         Tool(name="drugbank_medication_lookup",func=drugbank_lookup, description="Look up medication details, interactions, dosing from DrugBank."),
+        Tool(name="medical_multi_search",      func=multi_search,    description="Run several lookups in parallel. One per line as `vector|graph|pubmed|drug: <query>`."),
     ]
 
 
@@ -92,7 +312,7 @@ def build_agents(tools: List[Any]):
             "You combine clinical intuition with rigorous knowledge graph analysis."
         ),
         tools=tools,
-        verbose=VERBOSE_AGENTS,
+        verbose=False,
         llm=llm_kwargs,
         max_iter=5,
     )
@@ -110,7 +330,7 @@ def build_agents(tools: List[Any]):
             "to create accurate, actionable prognosis reports."
         ),
         tools=tools,
-        verbose=VERBOSE_AGENTS,
+        verbose=False,
         llm=llm_kwargs,
         max_iter=5,
     )
@@ -128,7 +348,7 @@ def build_agents(tools: List[Any]):
             "evidence-based programs that patients can realistically follow."
         ),
         tools=tools,
-        verbose=VERBOSE_AGENTS,
+        verbose=False,
         llm=llm_kwargs,
         max_iter=4,
     )
@@ -146,7 +366,7 @@ def build_agents(tools: List[Any]):
             "medication regimens tailored to each patient's profile."
         ),
         tools=tools,
-        verbose=VERBOSE_AGENTS,
+        verbose=False,
         llm=llm_kwargs,
         max_iter=4,
     )
@@ -158,30 +378,21 @@ def build_agents(tools: List[Any]):
 # Task Builder
 # ──────────────────────────────────────────────────────────────
 
-def build_tasks(report_text: str, patient_profile: dict,
-                diagnosis_agent, prognosis_agent, lifestyle_agent, medication_agent):
-    """Build CrewAI tasks with structured output schemas."""
-    from crewai import Task
-
-    profile_str = json.dumps(patient_profile, indent=2)
-
-    diagnosis_task = Task(
-        description=f"""
-Analyze the following medical report text and patient profile.
-Extract and diagnose all identified medical conditions.
-
-PATIENT PROFILE:
-{profile_str}
+# Prompts are constant apart from the report and profile, so each one is
+# compiled once at import into a string.Template; build_tasks only substitutes.
+# Static text (instructions + output schema) comes first and per-patient data
+# last, so the provider's prompt-prefix cache can reuse the shared prefix
+# across reports. Bump _PROMPT_VERSION whenever a prompt changes.
 
-MEDICAL REPORT TEXT:
-{report_text}
+_PROMPT_VERSION = "2"
 
+_DIAGNOSIS_SCHEMA = """
 Use the medical_vector_search and medical_graph_query tools to cross-reference findings.
 Return a JSON object with this structure:
-{{
+{
   "summary": "2-3 paragraph clinical summary",
   "conditions": [
-    {{
+    {
       "name": "Condition name",
       "icd10_code": "ICD-10 code",
       "severity": "low|medium|high",
@@ -189,92 +400,60 @@ Return a JSON object with this structure:
       "description": "clinical description",
       "evidence": "lab values or findings supporting this",
       "source": "data source used"
-    }}
+    }
   ],
   "risk_score": "X.X/10",
   "confidence": "XX.X%"
-}}
-""",
-        agent=diagnosis_agent,
-        expected_output="JSON with clinical summary and diagnosed conditions list"
-    )
-
-    prognosis_task = Task(
-        description=f"""
-Based on the diagnosed conditions from the previous analysis and patient profile below,
-predict future health risks with probability scores.
-
-PATIENT PROFILE:
-{profile_str}
+}
+"""
 
+_PROGNOSIS_SCHEMA = """
 Query the knowledge graph for disease progression pathways and epidemiological risk data.
 Return a JSON array of risks:
-{{
+{
   "risks": [
-    {{
+    {
       "name": "Risk condition name",
       "probability": 0-100,
       "timeframe": "3-months|1-year|5-years",
       "description": "why this risk exists",
       "prevention": "preventive measures"
-    }}
+    }
   ]
-}}
-""",
-        agent=prognosis_agent,
-        expected_output="JSON with health risk predictions and probability scores"
-    )
-
-    lifestyle_task = Task(
-        description=f"""
-Create a comprehensive, evidence-based diet and exercise plan for the patient
-given their conditions and profile.
-
-PATIENT PROFILE:
-{profile_str}
+}
+"""
 
+_LIFESTYLE_SCHEMA = """
 Use pubmed_research_search to find the latest dietary and exercise guidelines.
 Return a JSON object:
-{{
-  "diet": {{
+{
+  "diet": {
     "recommended": ["food1", "food2"],
     "avoid": ["food1", "food2"],
     "meal_plan": "sample 3-day meal plan text",
-    "macros": {{"protein": "Xg", "carbs": "Xg", "fat": "Xg", "calories": "XXXX kcal"}},
+    "macros": {"protein": "Xg", "carbs": "Xg", "fat": "Xg", "calories": "XXXX kcal"},
     "supplements": ["supplement1", "supplement2"]
-  }},
+  },
   "exercises": [
-    {{
+    {
       "icon": "emoji",
       "name": "Exercise name",
       "intensity": "low|moderate|high",
       "duration": "XX min",
       "frequency": "Nx/week",
       "description": "why this exercise benefits the patient"
-    }}
+    }
   ],
   "sleep_recommendation": "7-8 hours, consistent schedule...",
   "stress_management": "Mindfulness, breathing exercises..."
-}}
-""",
-        agent=lifestyle_agent,
-        expected_output="JSON with diet plan, exercise regimen, and lifestyle recommendations"
-    )
-
-    medication_task = Task(
-        description=f"""
-Review the diagnosed conditions and create medication recommendations.
-Check for interactions using drugbank_medication_lookup.
-
-PATIENT PROFILE:
-{profile_str}
-CURRENT MEDICATIONS: {patient_profile.get('current_meds', 'None listed')}
-ALLERGIES: {patient_profile.get('allergies', 'None listed')}
+}
+"""
 
+_MEDICATION_SCHEMA = """
 Return a JSON object:
-{{
+{
   "medications": [
-    {{
+    {
       "name": "Drug name",
       "generic_name": "generic",
       "dosage": "XXmg frequency",
@@ -284,12 +463,81 @@ Return a JSON object:
       "interactions": "interactions to watch",
       "monitoring": "lab tests needed",
       "source": "DrugBank ID"
-    }}
+    }
   ],
   "interactions_warning": ["any critical drug-drug interactions"],
   "stop_medications": ["any current meds that should be reviewed"]
-}}
-""",
+}
+"""
+
+
+_DIAGNOSIS_TEMPLATE = Template(
+    "\nAnalyze the following medical report text and patient profile.\n"
+    "Extract and diagnose all identified medical conditions.\n"
+    + _DIAGNOSIS_SCHEMA
+    + "${profile_block}"
+    "\nMEDICAL REPORT TEXT:\n${report_text}\n"
+)
+
+_PROGNOSIS_TEMPLATE = Template(
+    "\nBased on the diagnosed conditions from the previous analysis and patient profile below,\n"
+    "predict future health risks with probability scores.\n"
+    + _PROGNOSIS_SCHEMA
+    + "${profile_block}"
+)
+
+_LIFESTYLE_TEMPLATE = Template(
+    "\nCreate a comprehensive, evidence-based diet and exercise plan for the patient\n"
+    "given their conditions and profile.\n"
+    + _LIFESTYLE_SCHEMA
+    + "${profile_block}"
+)
+
+_MEDICATION_TEMPLATE = Template(
+    "\nReview the diagnosed conditions and create medication recommendations.\n"
+    "Check for interactions using drugbank_medication_lookup.\n"
+    + _MEDICATION_SCHEMA
+    + "${profile_block}"
+    "CURRENT MEDICATIONS: ${current_meds}\n"
+    "ALLERGIES: ${allergies}\n"
+)
+
+
+def build_tasks(report_text: str, patient_profile: dict,
+                diagnosis_agent, prognosis_agent, lifestyle_agent, medication_agent):
+    """Build CrewAI tasks with structured output schemas."""
+    from crewai import Task
+
+    profile_str = json.dumps(patient_profile, indent=2)
+    # Shared by all four prompts - formatted once per request
+    profile_block = f"\nPATIENT PROFILE:\n{profile_str}\n"
+
+    diagnosis_task = Task(
+        description=_DIAGNOSIS_TEMPLATE.substitute(
+            profile_block=profile_block, report_text=report_text
+        ),
+        agent=diagnosis_agent,
+        expected_output="JSON with clinical summary and diagnosed conditions list"
+    )
+
+    prognosis_task = Task(
+        description=_PROGNOSIS_TEMPLATE.substitute(profile_block=profile_block),
+        agent=prognosis_agent,
+        expected_output="JSON with health risk predictions and probability scores"
+    )
+
+    lifestyle_task = Task(
+        description=_LIFESTYLE_TEMPLATE.substitute(profile_block=profile_block),
+        agent=lifestyle_agent,
+        expected_output="JSON with diet plan, exercise regimen, and lifestyle recommendations"
+    )
+
+    medication_task = Task(
+        description=_MEDICATION_TEMPLATE.substitute(
+            profile_block=profile_block,
+            current_meds=patient_profile.get("current_meds", "None listed"),
+            allergies=patient_profile.get("allergies", "None listed"),
+        ),
         agent=medication_agent,
         expected_output="JSON with medication recommendations and interaction warnings"
     )
@@ -297,6 +545,324 @@ Return a JSON object:
     return diagnosis_task, prognosis_task, lifestyle_task, medication_task
 
 
+# ──────────────────────────────────────────────────────────────
+# Response Cache
+# ──────────────────────────────────────────────────────────────
+
+class ResponseCache:
+    """
+    Caches raw per-task LLM outputs keyed by (task, report, profile, model).
+
+    Uses Redis when REDIS_URL is set and the client is installed; otherwise
+    falls back to an in-process LRU (RESPONSE_CACHE_SIZE entries, TTL
+    expiry) so repeated uploads still hit. Redis errors degrade to a miss.
+    Bumping the generation (see `invalidate`) orphans every existing entry.
+    """
+
+    PREFIX = "medai:llm"
+
+    def __init__(self, redis_url: str = REDIS_URL, ttl_seconds: int = RESPONSE_CACHE_TTL,
+                 max_entries: int = RESPONSE_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._redis = None
+        self._local: "OrderedDict[str, Any]" = OrderedDict()  # key -> (expires_at, value)
+        self._generation = 0
+        self._lock = threading.Lock()
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+                self._redis.ping()
+                logger.info("✅ Redis response cache ready")
+            except Exception as e:
+                logger.warning(f"Redis unavailable, using in-process response cache: {e}")
+                self._redis = None
+
+    def _current_generation(self) -> int:
+        try:
+            if self._redis is not None:
+                return int(self._redis.get(f"{self.PREFIX}:generation") or 0)
+        except Exception as e:
+            logger.warning(f"Response cache generation read failed: {e}")
+        return self._generation
+
+    def make_key(self, task_name: str, report_text: str, patient_profile: dict,
+                 variant: str = "") -> str:
+        normalized = " ".join(report_text.split())
+        payload = "\x00".join([
+            task_name, LLM_MODEL, _PROMPT_VERSION, variant, normalized,
+            json.dumps(patient_profile, sort_keys=True, default=str),
+        ])
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return f"{self.PREFIX}:{self._current_generation()}:{digest}"
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            if self._redis is not None:
+                return self._redis.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, value: str) -> None:
+        try:
+            if self._redis is not None:
+                self._redis.set(key, value, ex=self.ttl_seconds)
+                return
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+            return
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Drop all cached responses (e.g. after the knowledge base changes)."""
+        try:
+            if self._redis is not None:
+                self._redis.incr(f"{self.PREFIX}:generation")
+                return
+        except Exception as e:
+            logger.warning(f"Response cache invalidation failed: {e}")
+        with self._lock:
+            self._generation += 1
+            self._local.clear()
+
+
+_RESPONSE_CACHE: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache."""
+    global _RESPONSE_CACHE
+    if _RESPONSE_CACHE is None:
+        _RESPONSE_CACHE = ResponseCache()
+    return _RESPONSE_CACHE
+
+
+# ──────────────────────────────────────────────────────────────
+# Agent Trace Logging
+# ──────────────────────────────────────────────────────────────
+# CrewAI's verbose mode prints synchronously to stdout, which serializes the
+# parallel agent threads. Steps are instead enqueued here and written to a
+# rotating file by a single listener thread.
+
+_TRACE_LOGGER = logging.getLogger("medai.agent_trace")
+_TRACE_LISTENER: Optional[QueueListener] = None
+_TRACE_LOCK = threading.Lock()
+
+
+def _trace_logger() -> logging.Logger:
+    global _TRACE_LISTENER
+    with _TRACE_LOCK:
+        if _TRACE_LISTENER is None:
+            queue = SimpleQueue()
+            file_handler = RotatingFileHandler(
+                AGENT_TRACE_LOG, maxBytes=10 * 1024 * 1024, backupCount=3, encoding="utf-8"
+            )
+            file_handler.setFormatter(logging.Formatter("%(asctime)s [%(threadName)s] %(message)s"))
+            _TRACE_LISTENER = QueueListener(queue, file_handler)
+            _TRACE_LISTENER.start()
+            atexit.register(_TRACE_LISTENER.stop)
+
+            _TRACE_LOGGER.addHandler(QueueHandler(queue))
+            _TRACE_LOGGER.setLevel(logging.INFO)
+            _TRACE_LOGGER.propagate = False
+    return _TRACE_LOGGER
+
+
+def _trace_step(task_name: str, step: Any) -> None:
+    """CrewAI step_callback: log the agent's tool call or final answer."""
+    tool = getattr(step, "tool", None)
+    if tool is not None:
+        _trace_logger().info("%s -> %s(%s)", task_name, tool, str(getattr(step, "tool_input", ""))[:500])
+    else:
+        _trace_logger().info("%s: %s", task_name, str(getattr(step, "output", step))[:2000])
+
+
+# ──────────────────────────────────────────────────────────────
+# Crew Execution
+# ──────────────────────────────────────────────────────────────
+
+def _kickoff_parallel(crews: List[Any]) -> Iterator[int]:
+    """
+    Kick off independent crews concurrently (bounded by MAX_PARALLEL_AGENTS).
+    Yields the index of each crew as it finishes.
+
+    Each worker runs in a copy of the caller's context, so LangChain
+    callbacks and the active LangSmith trace carry over to the parallel
+    agents instead of starting detached root runs.
+    """
+    if MAX_PARALLEL_AGENTS <= 1 or len(crews) <= 1:
+        for i, crew in enumerate(crews):
+            crew.kickoff()
+            yield i
+        return
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_AGENTS, len(crews))) as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, crew.kickoff): i
+            for i, crew in enumerate(crews)
+        }
+        for future in as_completed(futures):
+            future.result()
+            yield futures[future]
+
+
+def _safe_parse(raw: str) -> Optional[Dict[str, Any]]:
+    """Parse an agent's JSON output; None if it isn't a JSON object."""
+    try:
+        parsed = _json_loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _parse_confidence(value: Any) -> Optional[float]:
+    """Read a confidence given as 92, "92.5" or "92.5%"; None if unparseable."""
+    try:
+        return float(str(value).strip().rstrip("%"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ──────────────────────────────────────────────────────────────
+# Pipeline Stages (shared by the sync and streaming entry points)
+# ──────────────────────────────────────────────────────────────
+
+# Off-critical-path work for a run: document indexing and client setup
+_BACKGROUND = ThreadPoolExecutor(max_workers=4, thread_name_prefix="medai-bg")
+
+
+def _log_background_failure(future) -> None:
+    """Done-callback for fire-and-forget background jobs: surface their errors."""
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Background upload indexing failed: {error}", exc_info=error)
+
+
+class _AnalysisRun:
+    """State for one analysis: parsed report, cached/fresh outputs, crews."""
+
+    def __init__(self, uploaded_file, use_graphrag: bool, use_pinecone: bool,
+                 patient_profile: Optional[Dict]):
+        from ingestion import parse_document, index_document
+        from retriever import get_retriever, select_relevant_chunks
+        from graphrag_index import get_graph_engine
+
+        self.patient_profile = patient_profile or {}
+
+        # Step 1: Parse document
+        self.raw_text, self.metadata = parse_document(uploaded_file)
+
+        # Step 2: Look up cached outputs for each task
+        self.response_cache = get_response_cache()
+        variant = f"graphrag={use_graphrag},pinecone={use_pinecone}"
+        self.cache_keys = {
+            name: self.response_cache.make_key(name, self.raw_text, self.patient_profile, variant)
+            for name in _TASK_NAMES
+        }
+        self.outputs = {name: self.response_cache.get(key) for name, key in self.cache_keys.items()}
+        self.missing = [name for name in _TASK_NAMES if self.outputs[name] is None]
+        self.agents: Dict[str, Any] = {}
+        self.tasks: Dict[str, Any] = {}
+        if not self.missing:
+            return
+
+        # Step 3: Index into Pinecone. The agents don't read this upload back
+        # (it lands outside the knowledge-base namespace), so the embed+upsert
+        # runs in the background while the LLM works.
+        if use_pinecone:
+            _BACKGROUND.submit(index_document, self.raw_text, self.metadata).add_done_callback(
+                _log_background_failure
+            )
+
+        # Step 4: Initialize retriever + graph (connection setup runs concurrently)
+        retriever_future = _BACKGROUND.submit(get_retriever) if use_pinecone else None
+        graph_future = _BACKGROUND.submit(get_graph_engine) if use_graphrag else None
+        retriever = retriever_future.result() if retriever_future else None
+        graph_engine = graph_future.result() if graph_future else None
+
+        # Step 5: Build tools + agents + tasks. Long reports are cut down to
+        # the chunks most relevant to the patient profile to bound prompt size.
+        report_context = select_relevant_chunks(
+            self.raw_text, " ".join(str(v) for v in self.patient_profile.values())
+        )
+        tools = build_tools(retriever, graph_engine)
+        self.agents = dict(zip(_TASK_NAMES, build_agents(tools)))
+        self.tasks = dict(zip(_TASK_NAMES, build_tasks(
+            report_context, self.patient_profile, *self.agents.values()
+        )))
+
+    @property
+    def downstream(self) -> List[str]:
+        return [name for name in self.missing if name != "diagnosis"]
+
+    def crew_for(self, name: str):
+        from crewai import Crew, Process
+        return Crew(
+            agents=[self.agents[name]],
+            tasks=[self.tasks[name]],
+            process=Process.sequential,
+            verbose=False,
+            step_callback=partial(_trace_step, name) if VERBOSE_AGENTS else None,
+        )
+
+    def record(self, name: str) -> None:
+        """Store a finished task's output and cache it."""
+        self.outputs[name] = str(self.tasks[name].output.raw_output)
+        self.response_cache.put(self.cache_keys[name], self.outputs[name])
+
+    def inject_diagnosis(self) -> None:
+        # Downstream crews don't share a sequential context, so hand them the
+        # diagnosis output directly in their task descriptions.
+        for name in self.downstream:
+            task = self.tasks[name]
+            task.description = f"{task.description}\nDIAGNOSIS FINDINGS:\n{self.outputs['diagnosis']}\n"
+
+        # A confident diagnosis leaves little for downstream agents to research,
+        # so cap their tool/reasoning loops; max_iter stays the hard ceiling.
+        confidence = _parse_confidence((_safe_parse(self.outputs["diagnosis"]) or {}).get("confidence"))
+        if confidence is not None and confidence >= EARLY_EXIT_CONFIDENCE:
+            for name in self.downstream:
+                agent = self.agents[name]
+                agent.max_iter = min(agent.max_iter, CONFIDENT_MAX_ITER)
+
+    def task_result(self, name: str) -> Dict[str, Any]:
+        parsed = _safe_parse(self.outputs[name])
+        if parsed is None and name == "diagnosis":
+            return {"summary": self.outputs[name][:2000]}
+        return parsed or {}
+
+    def results(self) -> Dict[str, Any]:
+        # Step 7: Parse and merge results
+        results = {}
+        for name in _TASK_NAMES:
+            results.update(self.task_result(name))
+
+        results["raw_text"] = self.raw_text[:3000]
+        results["pages"] = self.metadata.get("pages", "N/A")
+        if not self.missing:
+            results["cache_status"] = "HIT"
+        elif len(self.missing) < len(_TASK_NAMES):
+            results["cache_status"] = "PARTIAL"
+        else:
+            results["cache_status"] = "MISS"
+        return results
+
+
 # ──────────────────────────────────────────────────────────────
 # Main Entry Point
 # ──────────────────────────────────────────────────────────────
@@ -305,73 +871,80 @@ def run_medical_analysis(
     uploaded_file,
     use_graphrag: bool = True,
     use_pinecone: bool = True,
-    patient_profile: Optional[Dict] = None
+    patient_profile: Optional[Dict] = None,
+    on_progress: Optional[Callable[[str], None]] = None
 ) -> Dict[str, Any]:
     """
     Main pipeline:
     1. Parse uploaded file → extract text
-    2. Embed into Pinecone (if enabled)
-    3. Build agents with tools
-    4. Run CrewAI crew
-    5. Return structured results dict
+    2. Serve cached task outputs for a previously seen report + profile
+    3. Embed into Pinecone (if enabled)
+    4. Build agents with tools
+    5. Run Diagnosis, then Prognosis/Lifestyle/Medication in parallel
+    6. Return structured results dict
+
+    `on_progress(task_name)` is called as each task's output becomes
+    available (cached tasks first, then in completion order). It runs on
+    the pipeline's threads, so it should only hand the name off.
     """
-    from crewai import Crew, Process
-    from ingestion import parse_document, index_document
-    from retriever import get_retriever
-    from graphrag_index import get_graph_engine
+    notify = on_progress or (lambda name: None)
+    run = _AnalysisRun(uploaded_file, use_graphrag, use_pinecone, patient_profile)
+    for name in _TASK_NAMES:
+        if name not in run.missing:
+            notify(name)
 
-    if patient_profile is None:
-        patient_profile = {}
+    # Step 6: Run Diagnosis first, then fan out the downstream agents
+    if "diagnosis" in run.missing:
+        run.crew_for("diagnosis").kickoff()
+        run.record("diagnosis")
+        notify("diagnosis")
 
-    # Step 1: Parse document
-    raw_text, metadata = parse_document(uploaded_file)
+    run.inject_diagnosis()
+    downstream = run.downstream
+    for i in _kickoff_parallel([run.crew_for(name) for name in downstream]):
+        run.record(downstream[i])
+        notify(downstream[i])
 
-    # Step 2: Index into Pinecone
-    if use_pinecone:
-        index_document(raw_text, metadata)
+    return run.results()
 
-    # Step 3: Initialize retriever + graph
-    retriever = get_retriever() if use_pinecone else None
-    graph_engine = get_graph_engine() if use_graphrag else None
 
-    # Step 4: Build tools + agents
-    tools = build_tools(retriever, graph_engine)
-    d_agent, p_agent, l_agent, m_agent = build_agents(tools)
+async def run_medical_analysis_stream(
+    uploaded_file,
+    use_graphrag: bool = True,
+    use_pinecone: bool = True,
+    patient_profile: Optional[Dict] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of `run_medical_analysis`.
 
-    # Step 5: Build tasks
-    d_task, p_task, l_task, m_task = build_tasks(
-        raw_text, patient_profile, d_agent, p_agent, l_agent, m_agent
+    Yields `{"<task>": {...}}` as each task finishes (cached tasks first,
+    then Diagnosis, then the parallel agents in completion order), and
+    finally `{"results": {...}}` with the same dict the sync call returns.
+    """
+    run = await asyncio.to_thread(
+        _AnalysisRun, uploaded_file, use_graphrag, use_pinecone, patient_profile
     )
 
-    # Step 6: Run crew
-    crew = Crew(
-        agents=[d_agent, p_agent, l_agent, m_agent],
-        tasks=[d_task, p_task, l_task, m_task],
-        process=Process.sequential,
-        verbose=VERBOSE_AGENTS,
-    )
+    for name in _TASK_NAMES:
+        if name not in run.missing:
+            yield {name: run.task_result(name)}
 
-    crew_output = crew.kickoff()
+    if "diagnosis" in run.missing:
+        await run.crew_for("diagnosis").kickoff_async()
+        run.record("diagnosis")
+        yield {"diagnosis": run.task_result("diagnosis")}
 
-    # Step 7: Parse and merge results
-    results = {}
-    try:
-        results.update(json.loads(d_task.output.raw_output))
-    except Exception:
-        results["summary"] = str(d_task.output.raw_output)[:2000]
-    try:
-        results.update(json.loads(p_task.output.raw_output))
-    except Exception:
-        pass
-    try:
-        results.update(json.loads(l_task.output.raw_output))
-    except Exception:
-        pass
-    try:
-        results.update(json.loads(m_task.output.raw_output))
-    except Exception:
-        pass
+    run.inject_diagnosis()
+    semaphore = asyncio.Semaphore(max(1, MAX_PARALLEL_AGENTS))
+
+    async def _run(name: str) -> str:
+        async with semaphore:
+            await run.crew_for(name).kickoff_async()
+        return name
+
+    for finished in asyncio.as_completed([_run(name) for name in run.downstream]):
+        name = await finished
+        run.record(name)
+        yield {name: run.task_result(name)}
 
-    results["raw_text"] = raw_text[:3000]
-    results["pages"] = metadata.get("pages", "N/A")
-    return results
+    yield {"results": run.results()}
@@ -0,0 +1,132 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║               MEDICAL AI AGENT - clients.py                  ║
+║     Process-wide HTTP + Pinecone clients (connection reuse)  ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import atexit
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Optional
+
+from config import (
+    OPENAI_API_KEY, PINECONE_API_KEY, PINECONE_INDEX, HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE, HTTP_TIMEOUT, PINECONE_POOL_THREADS, PINECONE_UPSERT_THREADS, EMBED_MODEL
+)
+
+logger = logging.getLogger(__name__)
+
+_LOCK = threading.Lock()
+_HTTP: Optional[Any] = None
+_PINECONE: Optional[Any] = None
+_PINECONE_INDEX: Optional[Any] = None
+_PINECONE_UPSERT_INDEX: Optional[Any] = None
+_OPENAI: Optional[Any] = None
+
+
+def get_http_client():
+    """
+    Shared httpx.Client for OpenAI, NCBI and other HTTPS calls.
+
+    Keeps TLS connections alive across tool calls and, when `h2` is
+    installed, multiplexes concurrent requests over HTTP/2.
+    Returns None if httpx is not installed (callers use their defaults).
+    """
+    global _HTTP
+    with _LOCK:
+        if _HTTP is None:
+            try:
+                import httpx
+            except ImportError:
+                return None
+            kwargs = {
+                "limits": httpx.Limits(
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                ),
+                "timeout": HTTP_TIMEOUT,
+            }
+            try:
+                _HTTP = httpx.Client(http2=True, **kwargs)
+            except ImportError:
+                logger.info("h2 not installed - shared HTTP client uses HTTP/1.1")
+                _HTTP = httpx.Client(**kwargs)
+            atexit.register(_HTTP.close)
+    return _HTTP
+
+
+def get_pinecone_client():
+    """Shared Pinecone client; index handles created from it share one connection pool."""
+    global _PINECONE
+    with _LOCK:
+        if _PINECONE is None:
+            from pinecone import Pinecone
+            _PINECONE = Pinecone(api_key=PINECONE_API_KEY, pool_threads=PINECONE_POOL_THREADS)
+    return _PINECONE
+
+
+def get_pinecone_index_handle():
+    """
+    Shared handle to PINECONE_INDEX. Its pool_threads back
+    upsert(async_req=True). Does not create the index; see
+    ingestion.get_pinecone_index.
+    """
+    global _PINECONE_INDEX
+    pc = get_pinecone_client()
+    with _LOCK:
+        if _PINECONE_INDEX is None:
+            _PINECONE_INDEX = pc.Index(PINECONE_INDEX, pool_threads=PINECONE_POOL_THREADS)
+    return _PINECONE_INDEX
+
+
+def get_pinecone_upsert_handle():
+    """
+    Index handle for bulk upserts. With `pinecone[grpc]` installed this is
+    a gRPC index: vector values go over the wire as packed float32 instead
+    of JSON decimal text (roughly a fifth of the bytes per vector). Falls
+    back to the shared REST handle.
+    """
+    global _PINECONE_UPSERT_INDEX
+    try:
+        from pinecone.grpc import PineconeGRPC
+    except ImportError:
+        return get_pinecone_index_handle()
+    with _LOCK:
+        if _PINECONE_UPSERT_INDEX is None:
+            _PINECONE_UPSERT_INDEX = PineconeGRPC(api_key=PINECONE_API_KEY).Index(
+                PINECONE_INDEX, pool_threads=PINECONE_UPSERT_THREADS
+            )
+    return _PINECONE_UPSERT_INDEX
+
+
+def get_openai_client():
+    """Shared sync OpenAI client on the shared HTTP client."""
+    global _OPENAI
+    http_client = get_http_client()
+    with _LOCK:
+        if _OPENAI is None:
+            from openai import OpenAI
+            _OPENAI = OpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+    return _OPENAI
+
+
+@lru_cache(maxsize=1)
+def get_openai_embeddings():
+    """Shared LangChain OpenAIEmbeddings for the Pinecone vector stores."""
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=EMBED_MODEL, openai_api_key=OPENAI_API_KEY,
+                            http_client=get_http_client())
+
+
+@lru_cache(maxsize=None)
+def get_chat_llm(model: str = "gpt-4o", temperature: float = 0):
+    """Shared LangChain ChatOpenAI per (model, temperature), on the shared HTTP client."""
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        api_key=OPENAI_API_KEY,
+        http_client=get_http_client()
+    )
@@ -34,6 +34,23 @@ TWILIO_FROM_NUMBER  = os.getenv("TWILIO_FROM_NUMBER",   "")
 # DeepL (for multi-language output)
 DEEPL_API_KEY = os.getenv("DEEPL_API_KEY", "")
 
+# NCBI Entrez (PubMed search) - an API key raises the limit from 3 to 10 req/s
+ENTREZ_EMAIL   = os.getenv("ENTREZ_EMAIL",   "test@test.com")
+ENTREZ_API_KEY = os.getenv("ENTREZ_API_KEY", "")
+
+# Defaults that mean "not configured" (see also NEO4J_PASSWORD below)
+_PLACEHOLDERS = frozenset({
+    "",
+    "sk-your-openai-api-key-here",
+    "your-pinecone-api-key-here",
+    "your-neo4j-password",
+})
+
+
+def is_configured(value: str) -> bool:
+    """True if a key/password was actually set (not empty or a placeholder)."""
+    return value not in _PLACEHOLDERS
+
 
 # ──────────────────────────────────────────────────────────────
 # Neo4j / Graph Database
@@ -43,6 +60,19 @@ NEO4J_URI      = os.getenv("NEO4J_URI",      "bolt://localhost:7687")
 NEO4J_USER     = os.getenv("NEO4J_USER",     "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "your-neo4j-password")
 
+# Bolt connection pool of the app's graph engine (shared by all queries)
+NEO4J_POOL_SIZE       = int(os.getenv("NEO4J_POOL_SIZE",         "32"))
+NEO4J_ACQUIRE_TIMEOUT = float(os.getenv("NEO4J_ACQUIRE_TIMEOUT", "30"))
+
+# Neo4j server's import folder (file:/// root for LOAD CSV). When set, the
+# Hetionet loader copies the TSVs there and Neo4j reads them directly;
+# leave empty for remote servers (e.g. AuraDB) to stream rows over Bolt.
+NEO4J_IMPORT_DIR       = os.getenv("NEO4J_IMPORT_DIR", "")
+# Rows per transaction when loading Hetionet / PubMed KG
+GRAPH_LOAD_BATCH_SIZE  = int(os.getenv("GRAPH_LOAD_BATCH_SIZE",  "10000"))
+# Batches in flight at once when streaming rows over Bolt
+GRAPH_LOAD_CONCURRENCY = int(os.getenv("GRAPH_LOAD_CONCURRENCY", "8"))
+
 # AuraDB (Neo4j cloud) - use for production
 # NEO4J_URI = os.getenv("NEO4J_URI", "neo4j+s://xxxxxxxx.databases.neo4j.io")
 
@@ -82,17 +112,99 @@ VISION_MODEL      = "gpt-4o"
 TOP_K_RETRIEVAL = int(os.getenv("TOP_K_RETRIEVAL", "8"))   # Vectors to retrieve
 CHUNK_SIZE      = int(os.getenv("CHUNK_SIZE",      "800")) # Characters per chunk
 CHUNK_OVERLAP   = int(os.getenv("CHUNK_OVERLAP",   "100")) # Overlap between chunks
+CHUNK_MIN_SIZE  = int(os.getenv("CHUNK_MIN_SIZE",  "100")) # Smaller chunks are merged into a neighbour
+
+# Worker processes for OCR of scanned PDF pages
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+
+# Document embedding: inputs per request, requests in flight, and SDK
+# retries (exponential backoff, honouring Retry-After on 429s)
+EMBED_BATCH_SIZE  = int(os.getenv("EMBED_BATCH_SIZE",  "100"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+# Embeddings rate limits (account tier); requests wait for budget instead
+# of hitting 429s. 0 disables a limit.
+EMBED_RPM = int(os.getenv("EMBED_RPM", "3000"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))
+
+# Knowledge-base ingestion of at least this many chunks goes through the
+# OpenAI Batch API (half price, separate quota, up to 24h turnaround)
+EMBED_BATCH_API_MIN_CHUNKS = int(os.getenv("EMBED_BATCH_API_MIN_CHUNKS", "1000"))
+EMBED_BATCH_POLL_SECONDS   = float(os.getenv("EMBED_BATCH_POLL_SECONDS", "60"))
+# Per-job limits; larger loads are split across several batch jobs
+EMBED_BATCH_API_MAX_INPUTS = int(os.getenv("EMBED_BATCH_API_MAX_INPUTS", "50000"))  # embedding inputs per job
+EMBED_BATCH_API_MAX_BYTES  = int(os.getenv("EMBED_BATCH_API_MAX_BYTES", str(190 * 1024 * 1024)))  # under the 200 MB file cap
+
+# Chunks read ahead of embedding when streaming large files (bounds memory)
+INGEST_CHUNKS_IN_FLIGHT = int(os.getenv("INGEST_CHUNKS_IN_FLIGHT", "2000"))
+
+# Token budget for report text in the diagnosis prompt; longer reports are
+# reduced to their most relevant chunks
+REPORT_CONTEXT_TOKENS = int(os.getenv("REPORT_CONTEXT_TOKENS", "4096"))
+
+# In-process cache for repeated agent lookups (exact + semantic match)
+QUERY_CACHE_CONFIG = {
+    "enabled":              os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true",
+    "max_size":             int(os.getenv("QUERY_CACHE_MAX_SIZE", "2000")),
+    "ttl_seconds":          int(os.getenv("QUERY_CACHE_TTL", "600")),
+    "similarity_threshold": float(os.getenv("QUERY_CACHE_SIMILARITY", "0.95")),
+}
+
+# Query embeddings are memoized process-wide (entries, LRU)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+
+# Concurrent similarity searches are coalesced into one embedding call
+SEARCH_BATCH_SIZE    = int(os.getenv("SEARCH_BATCH_SIZE",    "8"))
+SEARCH_BATCH_WAIT_MS = int(os.getenv("SEARCH_BATCH_WAIT_MS", "20"))
+
+
+# ──────────────────────────────────────────────────────────────
+# Response Cache (per-task LLM outputs)
+# ──────────────────────────────────────────────────────────────
+
+REDIS_URL          = os.getenv("REDIS_URL", "")  # Optional: empty = in-process cache
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(4 * 3600)))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))  # In-process entries (LRU)
+
+
+# ──────────────────────────────────────────────────────────────
+# HTTP Connection Reuse (OpenAI, NCBI, Pinecone)
+# ──────────────────────────────────────────────────────────────
+
+HTTP_MAX_CONNECTIONS  = int(os.getenv("HTTP_MAX_CONNECTIONS",  "64"))
+HTTP_MAX_KEEPALIVE    = int(os.getenv("HTTP_MAX_KEEPALIVE",    "32"))
+HTTP_TIMEOUT          = float(os.getenv("HTTP_TIMEOUT",        "30"))
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "16"))
+PINECONE_UPSERT_THREADS = int(os.getenv("PINECONE_UPSERT_THREADS", "30"))  # gRPC upsert handle's in-flight requests
+PINECONE_UPSERT_BATCH = int(os.getenv("PINECONE_UPSERT_BATCH", "64"))  # Vectors per upsert request
+PINECONE_UPSERT_WORKERS = int(os.getenv("PINECONE_UPSERT_WORKERS", "4"))  # Upserts overlapping embedding
+PINECONE_UPSERT_BYTES_PER_SEC = int(os.getenv("PINECONE_UPSERT_BYTES_PER_SEC", str(45 * 1024 * 1024)))  # Under the 50 MB/s namespace cap
 
 
 # ──────────────────────────────────────────────────────────────
 # Agent Configuration
 # ──────────────────────────────────────────────────────────────
 
+# When true, agent steps are traced to AGENT_TRACE_LOG (via a background
+# writer thread) rather than printed to stdout by CrewAI
 VERBOSE_AGENTS  = os.getenv("VERBOSE_AGENTS", "false").lower() == "true"
 MAX_AGENT_ITER  = int(os.getenv("MAX_AGENT_ITER", "5"))
 
+# Prognosis, Lifestyle and Medication run concurrently once Diagnosis is done.
+# Set to 1 to fall back to fully sequential execution.
+MAX_PARALLEL_AGENTS = int(os.getenv("MAX_PARALLEL_AGENTS", "3"))
+
+# Max concurrent lookups when an agent batches several tool queries at once
+TOOL_CONCURRENCY_LIMIT = int(os.getenv("TOOL_CONCURRENCY_LIMIT", "4"))
+
+# When the diagnosis reports at least this overall confidence (%), downstream
+# agents get a tighter iteration budget instead of their default max_iter
+EARLY_EXIT_CONFIDENCE = float(os.getenv("EARLY_EXIT_CONFIDENCE", "85"))
+CONFIDENT_MAX_ITER    = int(os.getenv("CONFIDENT_MAX_ITER",      "3"))
+
 # LangSmith tracing (optional monitoring)
-if LANGSMITH_API_KEY:
+if is_configured(LANGSMITH_API_KEY):
     os.environ["LANGCHAIN_TRACING_V2"] = "true"
     os.environ["LANGCHAIN_API_KEY"]     = LANGSMITH_API_KEY
     os.environ["LANGCHAIN_PROJECT"]     = "MedAI-Agent"
@@ -107,9 +219,29 @@ DATA_DIR        = BASE_DIR / "data"
 CACHE_DIR       = BASE_DIR / ".cache"
 EXPORT_DIR      = BASE_DIR / "exports"
 
-# Ensure directories exist
-for d in [DATA_DIR, CACHE_DIR, EXPORT_DIR]:
-    d.mkdir(parents=True, exist_ok=True)
+# Local sqlite-vec mirror of static collections (DrugBank) for KNN without Pinecone
+LOCAL_VECTOR_DB = Path(os.getenv("LOCAL_VECTOR_DB", str(CACHE_DIR / "local_vectors.db")))
+
+# Neo4j schema captured on first connect; deleted when the graph is rebuilt
+GRAPH_SCHEMA_CACHE = Path(os.getenv("GRAPH_SCHEMA_CACHE", str(CACHE_DIR / "neo4j_schema.json")))
+
+# GraphRAG answers keyed by question (in-process LRU in front of SQLite)
+GRAPH_QUERY_CACHE_DB   = Path(os.getenv("GRAPH_QUERY_CACHE_DB", str(CACHE_DIR / "graph_queries.db")))
+GRAPH_QUERY_CACHE_TTL  = int(os.getenv("GRAPH_QUERY_CACHE_TTL",  "86400"))
+GRAPH_QUERY_CACHE_SIZE = int(os.getenv("GRAPH_QUERY_CACHE_SIZE", "512"))
+
+# Document chunk embeddings keyed by model + text (re-ingest / resume skips the API)
+DOC_EMBED_CACHE_DB = Path(os.getenv("DOC_EMBED_CACHE_DB", str(CACHE_DIR / "doc_embeddings.db")))
+
+# Rotating log of agent steps (written when VERBOSE_AGENTS is on)
+AGENT_TRACE_LOG = Path(os.getenv("AGENT_TRACE_LOG", str(CACHE_DIR / "agent_trace.log")))
+
+# Ensure directories exist (later imports, e.g. every Streamlit rerun,
+# only stat them)
+_APP_DIRS = [DATA_DIR, CACHE_DIR, EXPORT_DIR]
+if not all(d.is_dir() for d in _APP_DIRS):
+    for d in _APP_DIRS:
+        d.mkdir(parents=True, exist_ok=True)
 
 
 # ──────────────────────────────────────────────────────────────
@@ -139,11 +271,11 @@ ALLOWED_EXTENSIONS = ["pdf", "png", "jpg", "jpeg", "tiff", "tif", "bmp"]
 def validate_config():
     """Check that required API keys are set."""
     warnings = []
-    if OPENAI_API_KEY.startswith("sk-your"):
+    if not is_configured(OPENAI_API_KEY):
         warnings.append("⚠️  OPENAI_API_KEY not set - agents will run in demo mode")
-    if PINECONE_API_KEY == "your-pinecone-api-key-here":
+    if not is_configured(PINECONE_API_KEY):
         warnings.append("⚠️  PINECONE_API_KEY not set - using mock retriever")
-    if NEO4J_PASSWORD == "your-neo4j-password":
+    if not is_configured(NEO4J_PASSWORD):
         warnings.append("⚠️  NEO4J_PASSWORD not set - using demo graph data")
     return warnings
 
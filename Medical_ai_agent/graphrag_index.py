@@ -1,12 +1,162 @@
 import os
 import json
+import time
+import asyncio
+import atexit
+import hashlib
 import logging
-from typing import Any, Dict, List, Optional
-
-from config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, OPENAI_API_KEY
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from config import (
+    NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, GRAPH_SCHEMA_CACHE, is_configured,
+    GRAPH_QUERY_CACHE_DB, GRAPH_QUERY_CACHE_TTL, GRAPH_QUERY_CACHE_SIZE,
+    NEO4J_IMPORT_DIR, GRAPH_LOAD_BATCH_SIZE, GRAPH_LOAD_CONCURRENCY,
+    NEO4J_POOL_SIZE, NEO4J_ACQUIRE_TIMEOUT, DATA_DIR
+)
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 logger = logging.getLogger(__name__)
 
+# Canned responses for demo mode, parsed once at import
+_DEMO_RESPONSES: Dict[str, Dict[str, Any]] = _json_loads(
+    (DATA_DIR / "demo_graph_responses.json").read_bytes()
+)
+
+
+class GraphQueryCache:
+    """
+    Two-tier cache for GraphRAG answers keyed by the natural-language question.
+
+    An in-process LRU sits in front of a SQLite table, so identical
+    questions skip Cypher generation and the Neo4j round trip both within
+    a process and across restarts. Entries expire after `ttl_seconds` so
+    knowledge-graph updates are eventually picked up.
+    """
+
+    def __init__(self, db_path=GRAPH_QUERY_CACHE_DB, ttl_seconds: int = GRAPH_QUERY_CACHE_TTL,
+                 max_size: int = GRAPH_QUERY_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS graph_queries "
+            "(key TEXT PRIMARY KEY, expires_at REAL, result TEXT)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _key(question: str) -> str:
+        return hashlib.sha256(" ".join(question.split()).encode("utf-8")).hexdigest()
+
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        key, now = self._key(question), time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                return entry[1]
+            row = self._db.execute(
+                "SELECT expires_at, result FROM graph_queries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[0] <= now:
+                return None
+            result = json.loads(row[1])
+            self._remember(key, row[0], result)
+            return result
+
+    def put(self, question: str, result: Dict[str, Any]) -> None:
+        key = self._key(question)
+        expires_at = time.time() + self.ttl_seconds
+        try:
+            payload = json.dumps(result, default=str)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._remember(key, expires_at, result)
+            self._db.execute(
+                "INSERT OR REPLACE INTO graph_queries VALUES (?, ?, ?)", (key, expires_at, payload)
+            )
+            self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM graph_queries")
+            self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, result: Dict[str, Any]) -> None:
+        self._memory[key] = (expires_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+
+_QUERY_CACHE: Optional[GraphQueryCache] = None
+_QUERY_CACHE_LOCK = threading.Lock()
+
+
+def get_graph_query_cache() -> Optional[GraphQueryCache]:
+    """Process-wide graph answer cache; None if the SQLite file can't be opened."""
+    global _QUERY_CACHE
+    with _QUERY_CACHE_LOCK:
+        if _QUERY_CACHE is None:
+            try:
+                _QUERY_CACHE = GraphQueryCache()
+            except sqlite3.Error as e:
+                logger.warning(f"Graph query cache disabled: {e}")
+                return None
+    return _QUERY_CACHE
+
+
+def clear_graph_query_cache() -> None:
+    """Drop every cached graph answer (memory and disk)."""
+    cache = get_graph_query_cache()
+    if cache is not None:
+        cache.clear()
+
+_DRIVER_CONFIG = {
+    "max_connection_pool_size": NEO4J_POOL_SIZE,
+    "connection_acquisition_timeout": NEO4J_ACQUIRE_TIMEOUT,
+    "keep_alive": True,
+}
+
+
+@lru_cache(maxsize=1)
+def _langchain_graph_classes():
+    """LangChain graph classes, imported on first real connection only."""
+    from langchain_community.graphs import Neo4jGraph
+    from langchain.chains import GraphCypherQAChain
+    return Neo4jGraph, GraphCypherQAChain
+
+
+# Every graph relation between each pair of the given compounds. Names are
+# matched on the stored lower-cased name_lower (indexed at load time).
+# Hetionet has no interaction metaedge: compound-compound edges are
+# "resembles" (structural similarity), so results are relations, not
+# interaction evidence.
+_DRUG_PAIRS_CYPHER = """
+MATCH (a:Compound) WHERE a.name_lower IN $drugs
+MATCH (a)-[r]-(b:Compound)
+WHERE b.name_lower IN $drugs AND a.name < b.name
+RETURN a.name AS drug_a, type(r) AS relation, b.name AS drug_b
+"""
+
+_COMPOUND_NAME_INDEX_CYPHER = (
+    "CREATE INDEX compound_name_lower IF NOT EXISTS FOR (n:Compound) ON (n.name_lower)"
+)
+
+
 class MedicalGraphEngine:
     """
     Wraps Neo4j graph database with LangChain GraphRAG.
@@ -28,30 +178,43 @@ class MedicalGraphEngine:
 
     def __init__(self):
         self.driver = None
+        self.graph = None
         self.graph_qa = None
         self._connect()
 
     def _connect(self):
         """Connect to Neo4j and initialize LangChain GraphCypherQAChain."""
+        if not is_configured(NEO4J_PASSWORD):
+            # Demo mode: don't pay for the LangChain import chain at all
+            logger.info("NEO4J_PASSWORD not set - graph engine in demo mode")
+            return
         try:
-            from langchain_community.graphs import Neo4jGraph
-            from langchain.chains import GraphCypherQAChain
-            from langchain_openai import ChatOpenAI
+            Neo4jGraph, GraphCypherQAChain = _langchain_graph_classes()
+            from clients import get_chat_llm
 
-            self.graph = Neo4jGraph(
+            # Schema introspection is slow (APOC meta calls); reuse the copy
+            # saved by a previous process when there is one
+            cached_schema = self._load_schema()
+            graph_kwargs = dict(
                 url=NEO4J_URI,
                 username=NEO4J_USER,
-                password=NEO4J_PASSWORD
-            )
-
-            llm = ChatOpenAI(
-                model="gpt-4o",
-                temperature=0,
-                api_key=OPENAI_API_KEY
+                password=NEO4J_PASSWORD,
+                refresh_schema=cached_schema is None
             )
+            try:
+                # One pooled Bolt driver serves every query from this engine
+                self.graph = Neo4jGraph(**graph_kwargs, driver_config=_DRIVER_CONFIG)
+            except TypeError:
+                # Older langchain-community: no driver_config, default pool
+                self.graph = Neo4jGraph(**graph_kwargs)
+            if cached_schema is None:
+                self._save_schema()
+            else:
+                self.graph.schema = cached_schema["schema"]
+                self.graph.structured_schema = cached_schema["structured_schema"]
 
             self.graph_qa = GraphCypherQAChain.from_llm(
-                llm=llm,
+                llm=get_chat_llm("gpt-4o", 0),
                 graph=self.graph,
                 verbose=True,
                 return_intermediate_steps=True,
@@ -62,19 +225,65 @@ class MedicalGraphEngine:
             logger.warning(f"Neo4j connection failed (demo mode): {e}")
             self.graph_qa = None
 
+    @staticmethod
+    def _load_schema() -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(GRAPH_SCHEMA_CACHE.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _save_schema(self):
+        try:
+            GRAPH_SCHEMA_CACHE.write_text(json.dumps({
+                "schema": self.graph.schema,
+                "structured_schema": self.graph.structured_schema,
+            }), encoding="utf-8")
+        except (OSError, TypeError) as e:
+            logger.debug(f"Graph schema not cached: {e}")
+
+    def refresh_schema(self) -> bool:
+        """Re-introspect the Neo4j schema and overwrite the cached copy."""
+        if self.graph is None:
+            return False
+        try:
+            self.graph.refresh_schema()
+        except Exception as e:
+            logger.warning(f"Graph schema refresh failed: {e}")
+            return False
+        self._save_schema()
+        return True
+
+    def close(self):
+        """Close the Bolt driver held by the LangChain graph wrapper."""
+        if self.graph is None:
+            return
+        try:
+            close = getattr(self.graph, "close", None) or self.graph._driver.close
+            close()
+        except Exception as e:
+            logger.debug(f"Neo4j close failed: {e}")
+        self.graph = None
+
     def query(self, question: str) -> Dict[str, Any]:
         """
         Natural language query against the medical knowledge graph.
         Falls back to mock data if Neo4j unavailable.
         """
         if self.graph_qa:
+            cache = get_graph_query_cache()
+            cached = cache.get(question) if cache else None
+            if cached is not None:
+                return cached
             try:
                 result = self.graph_qa.invoke({"query": question})
-                return {
+                answer = {
                     "answer": result.get("result", ""),
                     "cypher": result.get("intermediate_steps", [{}])[0].get("query", ""),
                     "data": result.get("intermediate_steps", [{}])[-1].get("context", [])
                 }
+                if cache:
+                    cache.put(question, answer)
+                return answer
             except Exception as e:
                 logger.error(f"Graph query error: {e}")
 
@@ -83,15 +292,8 @@ class MedicalGraphEngine:
 
     def _demo_query(self, question: str) -> Dict[str, Any]:
         """Return demo graph data for testing without Neo4j."""
-        return {
-            "answer": f"[Demo Mode] Graph query for: {question}",
-            "cypher": "MATCH (d:Disease)-[:TREATS]-(c:Compound) WHERE d.name CONTAINS $term RETURN d, c LIMIT 10",
-            "data": [
-                {"disease": "Type 2 Diabetes", "compound": "Metformin", "relation": "treats"},
-                {"disease": "Hypertension", "compound": "Amlodipine", "relation": "treats"},
-                {"gene": "INS", "disease": "Type 2 Diabetes", "relation": "associates"},
-            ]
-        }
+        demo = _DEMO_RESPONSES["default"]
+        return {**demo, "answer": demo["answer"].format(q=question)}
 
     def get_disease_relations(self, disease_name: str) -> Dict[str, Any]:
         """Get all relationships for a specific disease."""
@@ -103,7 +305,15 @@ class MedicalGraphEngine:
         return self.query(q)
 
     def get_drug_interactions(self, drug_list: List[str]) -> Dict[str, Any]:
-        """Check interactions between a list of drugs."""
+        """
+        Check interactions between a list of drugs. Direct graph relations
+        are returned when the graph has any; otherwise the question goes
+        through the natural-language chain.
+        """
+        if self.graph_qa:
+            direct = self.get_drug_interactions_direct(drug_list)
+            if direct is not None:
+                return direct
         drugs_str = ", ".join(drug_list)
         q = f"""
         Check if there are any known interactions or contraindications
@@ -112,6 +322,29 @@ class MedicalGraphEngine:
         """
         return self.query(q)
 
+    def get_drug_interactions_direct(self, drug_list: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Pairwise graph relations between the drugs via one parameterized
+        Cypher query, skipping the LLM Cypher-generation step. These are
+        knowledge-graph edges (in Hetionet, structural similarity), not
+        interaction findings. None if the query fails or finds nothing, so
+        callers fall back to the natural-language chain.
+        """
+        drugs = sorted({d.strip().lower() for d in drug_list if d and d.strip()})
+        try:
+            rows = self.graph.query(_DRUG_PAIRS_CYPHER, params={"drugs": drugs})
+        except Exception as e:
+            logger.warning(f"Direct drug relation query failed: {e}")
+            return None
+        if not rows:
+            return None
+        return {
+            "answer": (f"{len(rows)} graph relation(s) (not interaction evidence) between: "
+                       f"{', '.join(drug_list)}"),
+            "cypher": _DRUG_PAIRS_CYPHER.strip(),
+            "data": rows,
+        }
+
     def get_risk_propagation(self, condition: str) -> List[Dict]:
         """Get disease progression/risk paths from knowledge graph."""
         q = f"""
@@ -122,9 +355,251 @@ class MedicalGraphEngine:
         return result.get("data", [])
 
 
+_ENGINE: Optional[MedicalGraphEngine] = None
+_ENGINE_LOCK = threading.Lock()
+
+
 def get_graph_engine() -> MedicalGraphEngine:
     """Singleton factory for the graph engine."""
-    return MedicalGraphEngine()
+    global _ENGINE
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            _ENGINE = MedicalGraphEngine()
+            atexit.register(_ENGINE.close)
+    return _ENGINE
+
+# Every Hetionet node also carries the HetioNode label so edge endpoints are
+# found through one uniqueness index on id instead of a label-less full scan
+_HETIONET_CONSTRAINT_CYPHER = (
+    "CREATE CONSTRAINT hetionode_id IF NOT EXISTS FOR (n:HetioNode) REQUIRE n.id IS UNIQUE"
+)
+
+_HETIONET_NODES_CYPHER = """
+CALL apoc.periodic.iterate(
+  "LOAD CSV WITH HEADERS FROM $url AS row FIELDTERMINATOR '\\t' RETURN row",
+  "MERGE (n:HetioNode {id: row.id}) SET n.name = row.name, n.name_lower = toLower(row.name)
+   WITH n, row CALL apoc.create.addLabels(n, [row.kind]) YIELD node RETURN count(node)",
+  {batchSize: $batch_size, parallel: false, params: {url: $url}}
+) YIELD total, failedBatches
+RETURN total, failedBatches
+"""
+
+_HETIONET_EDGES_CYPHER = """
+CALL apoc.periodic.iterate(
+  "LOAD CSV WITH HEADERS FROM $url AS row FIELDTERMINATOR '\\t' RETURN row",
+  "MATCH (s:HetioNode {id: row.source}), (t:HetioNode {id: row.target})
+   CALL apoc.merge.relationship(s, row.metaedge, {}, {}, t, {}) YIELD rel RETURN count(rel)",
+  {batchSize: $batch_size, parallel: false, params: {url: $url}}
+) YIELD total, failedBatches
+RETURN total, failedBatches
+"""
+
+
+def _hetionet_node_merge(rows: List[Dict[str, str]]) -> str:
+    """
+    Node MERGE for a single-kind batch. The kind is written as a static
+    label, so the MERGE is planned against the HetioNode id index instead
+    of going through a dynamic-label APOC call.
+    """
+    kind = rows[0]["kind"].replace("`", "")
+    set_label = f"node:`{kind}`, " if kind else ""
+    return (
+        "UNWIND $nodes AS n "
+        "MERGE (node:HetioNode {id: n.id}) "
+        f"SET {set_label}node.name = n.name, node.name_lower = toLower(n.name)"
+    )
+
+
+def _split_by_kind(batches):
+    """Re-chunk row batches so every batch holds a single node kind."""
+    for rows in batches:
+        by_kind: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+        for row in rows:
+            by_kind[row["kind"]].append(row)
+        yield from by_kind.values()
+
+_HETIONET_EDGE_BATCH_CYPHER = """
+UNWIND $edges AS e
+MATCH (s:HetioNode {id: e.source}), (t:HetioNode {id: e.target})
+CALL apoc.merge.relationship(s, e.metaedge, {}, {}, t, {}) YIELD rel
+RETURN count(rel)
+"""
+
+
+def _iter_tsv_batches(path, columns: Dict[str, str], batch_size: int = GRAPH_LOAD_BATCH_SIZE):
+    """
+    Yield lists of row dicts (keys = `columns`) from a TSV, `batch_size` at a time.
+
+    Prefers Polars' multithreaded reader, then pandas' C parser chunk by
+    chunk, then csv.DictReader. Columns absent from the file (or empty
+    cells, with Polars) take the given default.
+    """
+    try:
+        import polars as pl
+    except ImportError:
+        pl = None
+
+    if pl is not None:
+        # Batched reader: only a few batches of the file are in memory at once
+        header = pl.read_csv(path, separator="\t", n_rows=0).columns
+        reader = pl.read_csv_batched(
+            path, separator="\t", infer_schema_length=0,
+            columns=[c for c in columns if c in header], batch_size=batch_size
+        )
+        exprs = [
+            pl.col(col).fill_null(default) if col in header else pl.lit(default).alias(col)
+            for col, default in columns.items()
+        ]
+        frames = reader.next_batches(1)
+        while frames:
+            for chunk in frames[0].select(exprs).iter_slices(batch_size):
+                yield chunk.to_dicts()
+            frames = reader.next_batches(1)
+        return
+
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+
+    if pd is not None:
+        header = pd.read_csv(path, sep="\t", nrows=0).columns
+        reader = pd.read_csv(
+            path, sep="\t", usecols=[c for c in columns if c in header],
+            dtype=str, keep_default_na=False, chunksize=batch_size
+        )
+        for chunk in reader:
+            for col, default in columns.items():
+                if col not in chunk.columns:
+                    chunk[col] = default
+            yield chunk[list(columns)].to_dict("records")
+        return
+
+    import csv
+    with open(path, encoding="utf-8", newline="") as f:
+        batch = []
+        for row in csv.DictReader(f, delimiter="\t"):
+            batch.append({col: row.get(col, default) for col, default in columns.items()})
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+class _NoProgress:
+    def update(self, n: int):
+        pass
+
+    def close(self):
+        pass
+
+
+def _progress_bar(unit: str):
+    """One tqdm bar per load (updated per batch); silent if tqdm is missing."""
+    try:
+        from tqdm import tqdm
+    except ImportError:
+        return _NoProgress()
+    return tqdm(unit=f" {unit}", unit_scale=True, desc=f"  {unit}")
+
+
+async def _write_batches_async(cypher: Union[str, Callable[[List[Dict]], str]], param: str,
+                               batches, label: str) -> int:
+    """
+    Submit UNWIND batches over the async Bolt driver, keeping up to
+    GRAPH_LOAD_CONCURRENCY transactions in flight while the next batch is
+    parsed on a worker thread (the loop stays free to drive the writes).
+    Each batch is a managed write, so deadlocks between concurrent merges
+    on shared nodes are retried by the driver; any other failure stops
+    the load as soon as it is seen, cancelling the writes still running.
+    `cypher` may be a function of the batch rows when the statement
+    depends on them.
+    """
+    from neo4j import AsyncGraphDatabase
+
+    async def write(tx, rows):
+        statement = cypher(rows) if callable(cypher) else cypher
+        result = await tx.run(statement, {param: rows})
+        await result.consume()
+
+    count = 0
+    progress = _progress_bar(label)
+    batches = iter(batches)
+    done_marker = object()
+
+    async with AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD)) as driver:
+        async def submit(rows):
+            nonlocal count
+            async with driver.session() as session:
+                await session.execute_write(write, rows)
+            count += len(rows)
+            progress.update(len(rows))
+
+        async def reap(pending: set, block: bool) -> set:
+            """Drop finished writes, re-raising the first failure; wait for one if `block`."""
+            if block:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                done = {task for task in pending if task.done()}
+                pending = pending - done
+            for task in done:
+                task.result()
+            return pending
+
+        pending: set = set()
+        try:
+            while True:
+                rows = await asyncio.to_thread(next, batches, done_marker)
+                if rows is done_marker:
+                    break
+                pending = await reap(pending, block=False)
+                while len(pending) >= GRAPH_LOAD_CONCURRENCY:
+                    pending = await reap(pending, block=True)
+                pending.add(asyncio.create_task(submit(rows)))
+            while pending:
+                pending = await reap(pending, block=True)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise
+        finally:
+            progress.close()
+    return count
+
+
+def _write_batches(cypher: Union[str, Callable[[List[Dict]], str]], param: str,
+                   batches, label: str) -> int:
+    """Blocking wrapper around `_write_batches_async` for the CLI loaders."""
+    return asyncio.run(_write_batches_async(cypher, param, batches, label))
+
+
+def _load_hetionet_server_side(session, nodes_file, edges_file):
+    """
+    Bulk-load Hetionet with LOAD CSV + apoc.periodic.iterate.
+
+    The TSVs are copied into NEO4J_IMPORT_DIR (the server's import folder)
+    and read by Neo4j directly, committing every GRAPH_LOAD_BATCH_SIZE rows.
+    Batches run serially: parallel merges on shared nodes deadlock.
+    """
+    import shutil
+    from pathlib import Path
+
+    import_dir = Path(NEO4J_IMPORT_DIR)
+    for label, src, cypher in (("nodes", nodes_file, _HETIONET_NODES_CYPHER),
+                               ("edges", edges_file, _HETIONET_EDGES_CYPHER)):
+        if not src.exists():
+            continue
+        dest = import_dir / src.name
+        if not dest.exists() or dest.stat().st_size != src.stat().st_size:
+            shutil.copy2(src, dest)
+        print(f"Loading {label} (server-side LOAD CSV)...")
+        record = session.run(
+            cypher, url=f"file:///{src.name}", batch_size=GRAPH_LOAD_BATCH_SIZE
+        ).single()
+        print(f"✅ Total {label}: {record['total']} (failed batches: {record['failedBatches']})")
+
 
 def build_hetionet_graph(data_dir: str = "./data/hetionet"):
     """
@@ -136,11 +611,13 @@ def build_hetionet_graph(data_dir: str = "./data/hetionet"):
       - hetionet-v1.0-nodes.tsv
       - hetionet-v1.0-edges.tsv
 
+    When NEO4J_IMPORT_DIR is set the files are loaded server-side with
+    LOAD CSV; otherwise rows are streamed over Bolt in batches.
+
     Usage:
         python graphrag_index.py
     """
     from pathlib import Path
-    import csv
 
     try:
         from neo4j import GraphDatabase
@@ -158,60 +635,46 @@ def build_hetionet_graph(data_dir: str = "./data/hetionet"):
         return
 
     with driver.session() as session:
-        # ── Load Nodes ──────────────────────
-        print("Loading nodes...")
-        with open(nodes_file, encoding="utf-8") as f:
-            reader = csv.DictReader(f, delimiter="\t")
-            batch = []
-            count = 0
-            for row in reader:
-                batch.append({"id": row["id"], "name": row["name"], "kind": row["kind"]})
-                if len(batch) >= 500:
-                    session.run("""
-                    UNWIND $nodes AS n
-                    CALL apoc.merge.node([n.kind], {id: n.id}, {name: n.name}) YIELD node
-                    RETURN count(node)
-                    """, nodes=batch)
-                    count += len(batch)
-                    batch = []
-                    print(f"  ✓ {count} nodes loaded", end="\r")
-            if batch:
-                session.run("""
-                UNWIND $nodes AS n
-                MERGE (node {id: n.id, kind: n.kind})
-                SET node.name = n.name
-                """, nodes=batch)
-            print(f"\n✅ Total nodes: {count + len(batch)}")
-
-        # ── Load Edges ──────────────────────
-        if edges_file.exists():
-            print("Loading edges...")
-            with open(edges_file, encoding="utf-8") as f:
-                reader = csv.DictReader(f, delimiter="\t")
-                batch = []
-                count = 0
-                for row in reader:
-                    batch.append({
-                        "source": row["source"],
-                        "target": row["target"],
-                        "metaedge": row["metaedge"]
-                    })
-                    if len(batch) >= 500:
-                        session.run("""
-                        UNWIND $edges AS e
-                        MATCH (s {id: e.source}), (t {id: e.target})
-                        CALL apoc.merge.relationship(s, e.metaedge, {}, {}, t, {}) YIELD rel
-                        RETURN count(rel)
-                        """, edges=batch)
-                        count += len(batch)
-                        batch = []
-                        print(f"  ✓ {count} edges loaded", end="\r")
-            print(f"\n✅ Total edges: {count + len(batch)}")
+        # Index id before any MERGE/MATCH: both node merges and edge endpoint
+        # lookups become index seeks rather than scans
+        session.run(_HETIONET_CONSTRAINT_CYPHER)
+        session.run(_COMPOUND_NAME_INDEX_CYPHER)
+        if NEO4J_IMPORT_DIR:
+            # Neo4j reads the TSVs itself; Python only submits two statements
+            _load_hetionet_server_side(session, nodes_file, edges_file)
+        else:
+            # ── Load Nodes ──────────────────────
+            print("Loading nodes...")
+            count = _write_batches(
+                _hetionet_node_merge, "nodes",
+                _split_by_kind(_iter_tsv_batches(nodes_file, {"id": "", "name": "", "kind": ""})), "nodes"
+            )
+            print(f"✅ Total nodes: {count}")
+
+            # ── Load Edges ──────────────────────
+            if edges_file.exists():
+                print("Loading edges...")
+                count = _write_batches(
+                    _HETIONET_EDGE_BATCH_CYPHER, "edges",
+                    _iter_tsv_batches(edges_file, {"source": "", "target": "", "metaedge": ""}), "edges"
+                )
+                print(f"✅ Total edges: {count}")
 
     driver.close()
+    # The graph changed: cached schema and answers describe the old one
+    GRAPH_SCHEMA_CACHE.unlink(missing_ok=True)
+    clear_graph_query_cache()
     print("\n🎉 Hetionet graph loaded into Neo4j!")
 
 
+_PUBMEDKG_BATCH_CYPHER = """
+UNWIND $triples AS t
+MERGE (s:Entity {name: t.subject})
+MERGE (o:Entity {name: t.object})
+MERGE (s)-[:RELATES_TO {predicate: t.predicate, pmid: t.pmid}]->(o)
+"""
+
+
 def build_pubmedkg_graph(tsv_path: str = "./data/pubmedkg/pubmedkg_subset.tsv"):
     """
     Load PubMed KG triples into Neo4j.
@@ -221,7 +684,6 @@ def build_pubmedkg_graph(tsv_path: str = "./data/pubmedkg/pubmedkg_subset.tsv"):
     TSV format: subject | predicate | object | pmid
     """
     from pathlib import Path
-    import csv
 
     try:
         from neo4j import GraphDatabase
@@ -237,30 +699,20 @@ def build_pubmedkg_graph(tsv_path: str = "./data/pubmedkg/pubmedkg_subset.tsv"):
         return
 
     with driver.session() as session:
-        with open(tsv_file, encoding="utf-8") as f:
-            reader = csv.DictReader(f, delimiter="\t")
-            batch = []
-            count = 0
-            for row in reader:
-                batch.append({
-                    "subject": row.get("subject", ""),
-                    "predicate": row.get("predicate", "RELATES_TO"),
-                    "object": row.get("object", ""),
-                    "pmid": row.get("pmid", "")
-                })
-                if len(batch) >= 500:
-                    session.run("""
-                    UNWIND $triples AS t
-                    MERGE (s:Entity {name: t.subject})
-                    MERGE (o:Entity {name: t.object})
-                    MERGE (s)-[:RELATES_TO {predicate: t.predicate, pmid: t.pmid}]->(o)
-                    """, triples=batch)
-                    count += len(batch)
-                    batch = []
-                    print(f"  ✓ {count} triples", end="\r")
-            print(f"\n✅ PubMed KG loaded: {count} triples")
+        session.run("CREATE CONSTRAINT entity_name IF NOT EXISTS FOR (n:Entity) REQUIRE n.name IS UNIQUE")
+        columns = {"subject": "", "predicate": "RELATES_TO", "object": "", "pmid": ""}
+        count = _write_batches(
+            _PUBMEDKG_BATCH_CYPHER, "triples", _iter_tsv_batches(tsv_file, columns), "triples"
+        )
+        # Generated Cypher filters on r.predicate; index it once the edges
+        # exist rather than maintaining it through the bulk load
+        session.run("CREATE INDEX rel_predicate IF NOT EXISTS FOR ()-[r:RELATES_TO]-() ON (r.predicate)")
+        print(f"✅ PubMed KG loaded: {count} triples")
 
     driver.close()
+    # The graph changed: cached schema and answers describe the old one
+    GRAPH_SCHEMA_CACHE.unlink(missing_ok=True)
+    clear_graph_query_cache()
 
 
 if __name__ == "__main__":
@@ -7,19 +7,79 @@
 
 import os
 import io
+import re
+import json
+import array
+import time
+import atexit
+import asyncio
 import hashlib
 import logging
+import sqlite3
+import struct
+import threading
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import chain, islice
 from pathlib import Path
-from typing import Tuple, Dict, Any, List
+from typing import Tuple, Dict, Any, List, Callable, Iterable, Iterator, Optional
 
 from config import (
-    OPENAI_API_KEY, PINECONE_API_KEY, PINECONE_ENV,
-    PINECONE_INDEX, EMBED_MODEL, CHUNK_SIZE, CHUNK_OVERLAP
+    OPENAI_API_KEY, PINECONE_ENV,
+    PINECONE_INDEX, EMBED_MODEL, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_MIN_SIZE,
+    EMBED_BATCH_SIZE, EMBED_CONCURRENCY, EMBED_MAX_RETRIES, EMBED_RPM, EMBED_TPM,
+    EMBED_BATCH_API_MIN_CHUNKS, EMBED_BATCH_POLL_SECONDS,
+    EMBED_BATCH_API_MAX_INPUTS, EMBED_BATCH_API_MAX_BYTES,
+    PINECONE_UPSERT_BATCH, PINECONE_UPSERT_WORKERS, OCR_WORKERS, INGEST_CHUNKS_IN_FLIGHT,
+    DOC_EMBED_CACHE_DB, PINECONE_UPSERT_BYTES_PER_SEC
 )
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
 
+def _json_bytes(obj: Any) -> bytes:
+    """UTF-8 JSON for transport (Batch API JSONL): orjson when installed, else json."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _row_json(obj: Any, indent: bool = False) -> str:
+    """
+    Chunk text for a JSON record. Always the stdlib encoder (compact,
+    non-ASCII as-is): the text is hashed into vector IDs and embedding-store
+    keys, so it must not depend on which optional packages are installed.
+    """
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=str)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _content_hash(data: bytes) -> str:
+    """16-hex-char dedup key (SHA-256). Fixed so vector IDs match across environments."""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _file_hash(file_path: Path) -> str:
+    """`_content_hash` of a file's bytes, read in 1 MiB blocks."""
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()[:16]
+
+
 # ──────────────────────────────────────────────────────────────
 # PDF / Image Parsing
 # ──────────────────────────────────────────────────────────────
@@ -29,7 +89,7 @@ def parse_document(uploaded_file) -> Tuple[str, Dict[str, Any]]:
     Parse uploaded file (PDF or image) to raw text.
 
     Strategy:
-    - PDF  → pdfplumber (text layer) OR pytesseract (scanned pages)
+    - PDF  → PyMuPDF, else pdfplumber (text layer) OR pytesseract (scanned pages)
     - Image → pytesseract OCR
     - Falls back gracefully if dependencies missing
 
@@ -42,11 +102,32 @@ def parse_document(uploaded_file) -> Tuple[str, Dict[str, Any]]:
         "file_type": uploaded_file.type,
         "file_size_kb": len(file_bytes) // 1024,
         "pages": 1,
-        "hash": hashlib.sha256(file_bytes).hexdigest()[:16]
+        "hash": _content_hash(file_bytes)
     }
 
     # ── PDF Parsing ──────────────────────────
     if fname.endswith(".pdf"):
+        try:
+            import fitz  # PyMuPDF
+            page_texts = []
+            scanned = {}  # page index -> rendered page awaiting OCR
+            with fitz.open(stream=file_bytes, filetype="pdf") as pdf:
+                metadata["pages"] = pdf.page_count
+                for i, page in enumerate(pdf):
+                    page_text = page.get_text("text")
+                    if len(page_text.strip()) < 50:
+                        # Scanned page - fall back to OCR
+                        scanned[i] = _render_gray_page(page, i + 1)
+                    page_texts.append(page_text)
+            for i, page_text in zip(scanned, _ocr_rendered_pages(list(scanned.values()))):
+                page_texts[i] = page_text
+            raw_text = "\n\n".join(
+                f"[PAGE {page_num}]\n{page_text}" for page_num, page_text in enumerate(page_texts, 1)
+            )
+            logger.info(f"PDF parsed: {metadata['pages']} pages, {len(raw_text)} chars")
+            return raw_text, metadata
+        except ImportError:
+            pass
         try:
             import pdfplumber
             text_parts = []
@@ -77,13 +158,22 @@ def parse_document(uploaded_file) -> Tuple[str, Dict[str, Any]]:
     elif any(fname.endswith(ext) for ext in [".png", ".jpg", ".jpeg", ".tiff", ".tif", ".bmp"]):
         try:
             import pytesseract
-            from PIL import Image
-            image = Image.open(io.BytesIO(file_bytes))
-            # Preprocess: convert to grayscale for better OCR
-            if image.mode != "L":
-                image = image.convert("L")
-            # Use tesseract with medical document config
-            custom_config = "--psm 3 --oem 3 -l eng"
+            preprocessed = _preprocess_for_ocr(file_bytes)
+            if preprocessed is not None:
+                image, ink_ratio = preprocessed
+                if ink_ratio < _BLANK_INK_RATIO:
+                    logger.info("Image OCR skipped: blank page")
+                    return "", metadata
+                # Already binarized + deskewed: LSTM engine only
+                custom_config = "--psm 3 --oem 1 -l eng"
+            else:
+                from PIL import Image
+                image = Image.open(io.BytesIO(file_bytes))
+                # Preprocess: convert to grayscale for better OCR
+                if image.mode != "L":
+                    image = image.convert("L")
+                # Use tesseract with medical document config
+                custom_config = "--psm 3 --oem 3 -l eng"
             raw_text = pytesseract.image_to_string(image, config=custom_config)
             metadata["ocr_engine"] = "tesseract"
             logger.info(f"Image OCR complete: {len(raw_text)} chars")
@@ -104,6 +194,100 @@ def parse_document(uploaded_file) -> Tuple[str, Dict[str, Any]]:
             return "[Unsupported file format]", metadata
 
 
+# Share of dark pixels below which an image is treated as a blank page
+_BLANK_INK_RATIO = 0.001
+
+
+def _preprocess_for_ocr(file_bytes: bytes):
+    """
+    Decode, Otsu-binarize and deskew an image with OpenCV ahead of tesseract.
+
+    Returns (image, ink_ratio) where ink_ratio is the share of dark pixels,
+    or None when OpenCV/numpy are missing or the format can't be decoded.
+    Skew is estimated from Hough lines through the smeared text rows.
+    """
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        return None
+
+    gray = cv2.imdecode(np.frombuffer(file_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    ink_ratio = cv2.countNonZero(ink) / ink.size
+    binary = cv2.bitwise_not(ink)
+    if ink_ratio < _BLANK_INK_RATIO:
+        return binary, ink_ratio
+
+    height, width = ink.shape
+    rows = cv2.dilate(ink, cv2.getStructuringElement(cv2.MORPH_RECT, (25, 1)))
+    lines = cv2.HoughLinesP(rows, 1, np.pi / 180, threshold=100,
+                            minLineLength=width // 3, maxLineGap=20)
+    if lines is not None:
+        angles = [
+            np.degrees(np.arctan2(y2 - y1, x2 - x1))
+            for x1, y1, x2, y2 in lines[:, 0]
+        ]
+        angles = [a for a in angles if abs(a) < 45]
+        skew = float(np.median(angles)) if angles else 0.0
+        if abs(skew) > 0.5:
+            matrix = cv2.getRotationMatrix2D((width / 2, height / 2), skew, 1.0)
+            binary = cv2.warpAffine(binary, matrix, (width, height), flags=cv2.INTER_NEAREST,
+                                    borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+    return binary, ink_ratio
+
+
+def _render_gray_page(page, page_num: int) -> Tuple[int, int, int, bytes]:
+    """Render a PyMuPDF page to a 200 dpi grayscale pixmap: (page_num, width, height, samples)."""
+    import fitz
+    pix = page.get_pixmap(dpi=200, colorspace=fitz.csGRAY)
+    return page_num, pix.width, pix.height, pix.samples
+
+
+def _ocr_rendered_page(rendered: Tuple[int, int, int, bytes]) -> str:
+    """OCR one page from `_render_gray_page`. Runs in an OCR worker process."""
+    page_num, width, height, samples = rendered
+    try:
+        import pytesseract
+        from PIL import Image
+        img = Image.frombytes("L", (width, height), samples)
+        return pytesseract.image_to_string(img, config="--psm 6 --oem 1 -l eng")
+    except Exception as e:
+        return f"[OCR failed for page {page_num}: {e}]"
+
+
+_OCR_POOL = None
+_OCR_POOL_LOCK = threading.Lock()
+
+
+def _ocr_rendered_pages(pages: List[Tuple[int, int, int, bytes]]) -> List[str]:
+    """
+    OCR rendered pages in order. Tesseract is CPU-bound, so multiple pages
+    are spread over a shared pool of OCR_WORKERS processes (spawned, as
+    the app's server threads make forking unsafe).
+    """
+    global _OCR_POOL
+    if len(pages) <= 1 or OCR_WORKERS <= 1:
+        return [_ocr_rendered_page(p) for p in pages]
+    with _OCR_POOL_LOCK:
+        if _OCR_POOL is None:
+            _OCR_POOL = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(_OCR_POOL.shutdown)
+        pool = _OCR_POOL
+    try:
+        return list(pool.map(_ocr_rendered_page, pages))
+    except BrokenProcessPool:
+        logger.warning("OCR worker pool died; OCR'ing pages in-process")
+        with _OCR_POOL_LOCK:
+            if _OCR_POOL is pool:
+                _OCR_POOL = None
+        return [_ocr_rendered_page(p) for p in pages]
+
+
 def _ocr_pdf_page(page, page_num: int) -> str:
     """OCR a single pdfplumber page using pytesseract."""
     try:
@@ -119,68 +303,694 @@ def _ocr_pdf_page(page, page_num: int) -> str:
 # Text Chunking
 # ──────────────────────────────────────────────────────────────
 
+@lru_cache(maxsize=8)
+def _splitter(chunk_size: int, overlap: int):
+    """Splitter per (chunk_size, overlap), built once; None without LangChain."""
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        return None
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        separators=["\n\n", "\n", ". ", "! ", "? ", ", ", " ", ""],
+        length_function=len
+    )
+
+
+# One sentence (or line) per match, trailing whitespace included; the
+# matches tile the text, so joining them gives it back unchanged
+_SENT_RE = re.compile(r"[^.!?\n]*(?:[.!?]+|\n+|$)\s*")
+
+
+def _sentence_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """
+    Fallback splitter without LangChain: pack whole sentences into chunks
+    of up to `chunk_size` chars in one regex scan, carrying trailing
+    sentences (up to `overlap` chars) into the next chunk. Sentences
+    longer than a chunk are cut at fixed width.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for match in _SENT_RE.finditer(text):
+        sentence = match.group()
+        if not sentence:
+            continue
+        if len(sentence) > chunk_size:
+            if current:
+                chunks.append("".join(current))
+                current, size = [], 0
+            step = max(chunk_size - overlap, 1)
+            chunks.extend(sentence[i:i + chunk_size] for i in range(0, len(sentence), step))
+            continue
+        if current and size + len(sentence) > chunk_size:
+            chunks.append("".join(current))
+            carry: List[str] = []
+            carried = 0
+            for prev in reversed(current):
+                if carried + len(prev) > overlap or carried + len(prev) + len(sentence) > chunk_size:
+                    break
+                carry.insert(0, prev)
+                carried += len(prev)
+            current, size = carry, carried
+        current.append(sentence)
+        size += len(sentence)
+    if current:
+        chunks.append("".join(current))
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+
+def _join_overlapping(left: str, right: str, overlap: int) -> str:
+    """Concatenate neighbouring chunks, dropping the text they share (up to `overlap` chars)."""
+    for k in range(min(len(left), len(right), overlap), 0, -1):
+        if left.endswith(right[:k]):
+            return left + right[k:]
+    return f"{left} {right}"
+
+
+def _compact_chunks(chunks: List[str], min_size: int = CHUNK_MIN_SIZE,
+                    max_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Merge pass over splitter output. A chunk shorter than `min_size` (or a
+    neighbour of one) is folded into the previous chunk when the result
+    still fits in `max_size`; anything over `max_size` is split again.
+    Each fragment removed is one embedding call and one vector fewer.
+    """
+    merged: List[str] = []
+    for chunk in chunks:
+        if merged and (len(chunk) < min_size or len(merged[-1]) < min_size):
+            candidate = _join_overlapping(merged[-1], chunk, overlap)
+            if len(candidate) <= max_size:
+                merged[-1] = candidate
+                continue
+        merged.append(chunk)
+
+    splitter = _splitter(max_size, 0)
+    compacted: List[str] = []
+    for chunk in merged:
+        if len(chunk) > max_size and splitter is not None:
+            compacted.extend(splitter.split_text(chunk))
+        else:
+            compacted.append(chunk)
+    return compacted
+
+
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
     """
     Split text into overlapping chunks for embedding.
     Uses sentence-aware splitting to preserve medical context.
     """
-    try:
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=overlap,
-            separators=["\n\n", "\n", ". ", "! ", "? ", ", ", " ", ""],
-            length_function=len
-        )
-        return splitter.split_text(text)
-    except ImportError:
-        # Simple fallback splitter
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
-            chunks.append(chunk)
-            start += chunk_size - overlap
-        return chunks
+    splitter = _splitter(chunk_size, overlap)
+    if splitter is not None:
+        return _compact_chunks(splitter.split_text(text), max_size=chunk_size, overlap=overlap)
+
+    return _compact_chunks(_sentence_chunks(text, chunk_size, overlap), max_size=chunk_size, overlap=overlap)
 
 
 # ──────────────────────────────────────────────────────────────
 # Embedding + Pinecone Upsert
 # ──────────────────────────────────────────────────────────────
 
-def get_embeddings(texts: List[str]) -> List[List[float]]:
-    """Embed a list of text strings using OpenAI ada-002."""
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
+class EmbeddingRateLimiter:
+    """
+    Per-minute request and token buckets for the embeddings endpoint,
+    shared by every thread and event loop in the process. A call waits
+    until both buckets cover it rather than provoking a 429.
+    """
+
+    def __init__(self, rpm: int = EMBED_RPM, tpm: int = EMBED_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        """Take budget for one request (returns 0) or return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self._updated = now - self._updated, now
+            waits = []
+            if self.rpm > 0:
+                self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+                waits.append((1 - self._requests) * 60 / self.rpm)
+            if self.tpm > 0:
+                tokens = min(tokens, self.tpm)  # oversized batches wait for a full bucket
+                self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+                waits.append((tokens - self._tokens) * 60 / self.tpm)
+            wait = max(waits, default=0.0)
+            if wait <= 0:
+                self._requests -= 1
+                self._tokens -= tokens
+            return wait
+
+    def acquire(self, tokens: int) -> None:
+        wait = self._reserve(tokens)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._reserve(tokens)
+
+    async def acquire_async(self, tokens: int) -> None:
+        wait = self._reserve(tokens)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._reserve(tokens)
+
+
+_EMBED_LIMITER = EmbeddingRateLimiter()
+
+
+@lru_cache(maxsize=1)
+def _embed_encoder():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(EMBED_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _batch_tokens(batch: List[str]) -> int:
+    """Tokens the embeddings endpoint will bill for `batch` (~4 chars/token without tiktoken)."""
+    encoder = _embed_encoder()
+    if encoder is None:
+        return sum(len(text) // 4 + 1 for text in batch)
+    return sum(len(tokens) for tokens in encoder.encode_batch(batch, disallowed_special=()))
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _windows(items: Iterable, size: int) -> Iterator[list]:
+    """Consume `items` lazily in lists of up to `size`."""
+    it = iter(items)
+    while True:
+        window = list(islice(it, size))
+        if not window:
+            return
+        yield window
+
+
+def _batches(items: List[str], size: int = EMBED_BATCH_SIZE) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _get_embeddings_sync(texts: List[str]) -> List[List[float]]:
+    """Embed batch by batch on the shared keep-alive client."""
+    from clients import get_openai_client
+    client = get_openai_client().with_options(max_retries=EMBED_MAX_RETRIES)
 
-    # Batch in groups of 100 (OpenAI limit)
     all_embeddings = []
-    batch_size = 100
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
+    for batch in _batches(texts):
+        _EMBED_LIMITER.acquire(_batch_tokens(batch))
         response = client.embeddings.create(model=EMBED_MODEL, input=batch)
         all_embeddings.extend([r.embedding for r in response.data])
     return all_embeddings
 
 
+async def _aget_embeddings(texts: List[str], concurrency: int = EMBED_CONCURRENCY) -> List[List[float]]:
+    """
+    Embed all batches concurrently, at most `concurrency` requests in
+    flight. Results are flattened in input order.
+    """
+    from openai import AsyncOpenAI
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    async with AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=EMBED_MAX_RETRIES) as client:
+        async def embed(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                await _EMBED_LIMITER.acquire_async(_batch_tokens(batch))
+                response = await client.embeddings.create(model=EMBED_MODEL, input=batch)
+            return [r.embedding for r in response.data]
+
+        results = await asyncio.gather(*(embed(batch) for batch in _batches(texts)))
+    return [emb for batch in results for emb in batch]
+
+
+class EmbeddingStore:
+    """
+    Persistent, content-addressed embeddings for document chunks.
+
+    Keyed by a hash of model + text, so re-ingesting unchanged text, or
+    resuming an interrupted knowledge-base load, skips the API for every
+    chunk already embedded. Vectors are stored as packed float16 in SQLite:
+    half the bytes of float32, and the ~1e-3 relative error is far below
+    what moves a cosine ranking.
+    """
+
+    _MAX_VARS = 500  # keys per SELECT (SQLite host-parameter limit)
+
+    def __init__(self, db_path=DOC_EMBED_CACHE_DB):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings_f16 (key BLOB PRIMARY KEY, vec BLOB)")
+        self._db.commit()
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        data = f"{EMBED_MODEL}\x00{text}".encode("utf-8")
+        return hashlib.sha256(data).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Stored vector for each text, None where missing."""
+        keys = [self._key(text) for text in texts]
+        found: Dict[bytes, bytes] = {}
+        with self._lock:
+            for i in range(0, len(keys), self._MAX_VARS):
+                part = keys[i:i + self._MAX_VARS]
+                found.update(self._db.execute(
+                    f"SELECT key, vec FROM embeddings_f16 WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall())
+        vectors: List[Optional[List[float]]] = []
+        for key in keys:
+            blob = found.get(key)
+            vectors.append(None if blob is None else list(struct.unpack(f"<{len(blob) // 2}e", blob)))
+        return vectors
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]) -> None:
+        rows = [(self._key(text), struct.pack(f"<{len(vec)}e", *vec)) for text, vec in zip(texts, vectors)]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings_f16 (key, vec) VALUES (?, ?)", rows)
+            self._db.commit()
+
+
+_EMBED_STORE: Optional[EmbeddingStore] = None
+_EMBED_STORE_LOCK = threading.Lock()
+
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """Process-wide chunk embedding store; None if the SQLite file can't be opened."""
+    global _EMBED_STORE
+    with _EMBED_STORE_LOCK:
+        if _EMBED_STORE is None:
+            try:
+                _EMBED_STORE = EmbeddingStore()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding store disabled: {e}")
+                return None
+    return _EMBED_STORE
+
+
+def _cached_embeddings(texts: List[str]) -> Tuple[List[Optional[List[float]]], List[str]]:
+    """(stored vector or None per text, texts still to embed)."""
+    store = get_embedding_store()
+    cached = store.get_many(texts) if store is not None else [None] * len(texts)
+    return cached, [text for text, vec in zip(texts, cached) if vec is None]
+
+
+def _merge_embeddings(cached: List[Optional[List[float]]], misses: List[str],
+                      fresh: List[List[float]]) -> List[List[float]]:
+    """Store freshly embedded misses and slot them back between the cached vectors."""
+    store = get_embedding_store()
+    if store is not None and misses:
+        store.put_many(misses, fresh)
+    fresh_iter = iter(fresh)
+    return [vec if vec is not None else next(fresh_iter) for vec in cached]
+
+
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Embed a list of text strings using OpenAI ada-002.
+
+    Texts already in the embedding store are not sent again. Multi-batch
+    inputs are sent concurrently; a single batch, or a call made from
+    inside a running event loop, goes out synchronously.
+    """
+    cached, misses = _cached_embeddings(texts)
+    if not misses:
+        fresh = []
+    elif len(misses) <= EMBED_BATCH_SIZE or _in_event_loop():
+        fresh = _get_embeddings_sync(misses)
+    else:
+        fresh = asyncio.run(_aget_embeddings(misses))
+    return _merge_embeddings(cached, misses, fresh)
+
+
+_CUSTOM_ID = re.compile(rb'"custom_id"\s*:\s*"group-(\d+)"')
+
+
+def _read_jsonl_record(f, offset: int) -> Dict[str, Any]:
+    f.seek(offset)
+    return _json_loads(f.readline())
+
+
+def embed_with_batch_api(texts: Iterable[str], poll_seconds: float = EMBED_BATCH_POLL_SECONDS) -> Iterator[List[float]]:
+    """
+    Embed `texts` through the OpenAI Batch API, blocking until the jobs
+    finish, and return an iterator over the embeddings in input order.
+
+    For offline jobs only: turnaround can be up to 24h. Requests are split
+    into several jobs so none exceeds EMBED_BATCH_API_MAX_INPUTS inputs or
+    EMBED_BATCH_API_MAX_BYTES of JSONL; all jobs are submitted before
+    polling, so they run side by side. The request and result files are
+    spooled to disk and read back one request at a time, so memory does
+    not grow with the input. Requests missing from the output (failed, or
+    a job expired) are re-embedded in real time.
+    """
+    from clients import get_openai_client
+    client = get_openai_client()
+
+    job_files: List[Any] = []  # one spooled JSONL request file per job
+    results_file = tempfile.TemporaryFile()
+    request_offsets: List[Tuple[int, int]] = []  # (job, offset) per request
+    result_offsets: Dict[int, int] = {}
+
+    def close_files():
+        for f in job_files:
+            f.close()
+        results_file.close()
+
+    try:
+        job_inputs = 0
+        for n, group in enumerate(_windows(texts, EMBED_BATCH_SIZE)):
+            line = _json_bytes(
+                {"custom_id": f"group-{n}", "method": "POST", "url": "/v1/embeddings",
+                 "body": {"model": EMBED_MODEL, "input": group}}
+            ) + b"\n"
+            if (not job_files or job_inputs + len(group) > EMBED_BATCH_API_MAX_INPUTS
+                    or job_files[-1].tell() + len(line) > EMBED_BATCH_API_MAX_BYTES):
+                job_files.append(tempfile.TemporaryFile())
+                job_inputs = 0
+            request_offsets.append((len(job_files) - 1, job_files[-1].tell()))
+            job_files[-1].write(line)
+            job_inputs += len(group)
+
+        batches = []
+        for f in job_files:
+            f.seek(0)
+            input_file = client.files.create(file=("embeddings.jsonl", f), purpose="batch")
+            batches.append(client.batches.create(
+                input_file_id=input_file.id, endpoint="/v1/embeddings", completion_window="24h"
+            ))
+        logger.info(f"Submitted {len(batches)} embedding batch job(s): {len(request_offsets)} requests")
+
+        for batch in batches:
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                time.sleep(poll_seconds)
+                batch = client.batches.retrieve(batch.id)
+            if batch.status != "completed":
+                logger.warning(f"Embedding batch {batch.id} ended {batch.status}")
+            if batch.output_file_id:
+                with client.files.with_streaming_response.content(batch.output_file_id) as response:
+                    for part in response.iter_bytes():
+                        results_file.write(part)
+
+        results_file.seek(0)
+        offset = 0
+        for line in results_file:
+            match = _CUSTOM_ID.search(line)
+            if match:
+                result_offsets[int(match.group(1))] = offset
+            offset += len(line)
+    except BaseException:
+        close_files()
+        raise
+
+    missing = len(request_offsets) - len(result_offsets)
+    if missing:
+        logger.warning(f"Re-embedding {missing}/{len(request_offsets)} batch requests in real time")
+
+    store = get_embedding_store()
+
+    def results() -> Iterator[List[float]]:
+        try:
+            for n, (job, request_offset) in enumerate(request_offsets):
+                embeddings = None
+                group = _read_jsonl_record(job_files[job], request_offset)["body"]["input"]
+                if n in result_offsets:
+                    response = _read_jsonl_record(results_file, result_offsets[n]).get("response") or {}
+                    if response.get("status_code") == 200:
+                        data = sorted(response["body"]["data"], key=lambda d: d["index"])
+                        embeddings = [d["embedding"] for d in data]
+                        if store is not None:
+                            store.put_many(group, embeddings)
+                if embeddings is None:
+                    embeddings = get_embeddings(group)
+                yield from embeddings
+        finally:
+            close_files()
+
+    return results()
+
+
+_INDEX_LOCK = threading.Lock()
+_INDEX_CHECKED = False
+
+
 def get_pinecone_index():
-    """Initialize and return the Pinecone index."""
-    from pinecone import Pinecone, ServerlessSpec
-    pc = Pinecone(api_key=PINECONE_API_KEY)
+    """
+    Return the shared Pinecone index handle for upserts, creating the index
+    on first use. Uses the gRPC transport when installed.
+    """
+    global _INDEX_CHECKED
+    from clients import get_pinecone_client, get_pinecone_upsert_handle
+
+    with _INDEX_LOCK:
+        if not _INDEX_CHECKED:
+            from pinecone import ServerlessSpec
+            pc = get_pinecone_client()
+
+            # Create index if it doesn't exist
+            existing = [idx.name for idx in pc.list_indexes()]
+            if PINECONE_INDEX not in existing:
+                pc.create_index(
+                    name=PINECONE_INDEX,
+                    dimension=1536,  # text-embedding-ada-002 dimension
+                    metric="cosine",
+                    spec=ServerlessSpec(cloud="aws", region=PINECONE_ENV)
+                )
+                logger.info(f"Created Pinecone index: {PINECONE_INDEX}")
+            _INDEX_CHECKED = True
+
+    return get_pinecone_upsert_handle()
+
+
+class PineconeRateLimiter:
+    """
+    Bytes-per-second bucket for upserts, shared across threads and event
+    loops. Keeps bulk ingestion under Pinecone's per-namespace write
+    throughput limit instead of tripping RESOURCE_EXHAUSTED errors.
+    """
+
+    def __init__(self, bytes_per_sec: int = PINECONE_UPSERT_BYTES_PER_SEC):
+        self.bytes_per_sec = bytes_per_sec
+        self._bytes = float(bytes_per_sec)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, size: int) -> float:
+        """Take budget for one upsert (returns 0) or return the seconds to wait."""
+        if self.bytes_per_sec <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self._updated = now - self._updated, now
+            self._bytes = min(self.bytes_per_sec, self._bytes + elapsed * self.bytes_per_sec)
+            size = min(size, self.bytes_per_sec)  # oversized batches wait for a full bucket
+            wait = (size - self._bytes) / self.bytes_per_sec
+            if wait <= 0:
+                self._bytes -= size
+            return wait
+
+    def acquire(self, size: int) -> None:
+        wait = self._reserve(size)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._reserve(size)
+
+    async def acquire_async(self, size: int) -> None:
+        wait = self._reserve(size)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._reserve(size)
+
+
+_UPSERT_LIMITER = PineconeRateLimiter()
+
+
+def _upsert_bytes(batch: List[Dict]) -> int:
+    """Rough request size: float32 values plus the chunk text and fixed metadata."""
+    return sum(len(v["values"]) * 4 + len(v["metadata"].get("text", "")) + 128 for v in batch)
+
+
+def _wait_upsert(result) -> None:
+    """Block on an async upsert: gRPC returns a future, REST an ApplyResult."""
+    if hasattr(result, "result"):
+        result.result()
+    else:
+        result.get()
+
+
+def _as_matrix(rows: Iterable[List[float]]):
+    """
+    Pack embeddings into one float32 (N, dim) array as they arrive, so a
+    window never holds N lists of boxed Python floats (~6x the memory).
+    Without numpy, each row is packed into an array("f").
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return [array.array("f", row) for row in rows]
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return np.empty((0, 0), dtype=np.float32)
+    flat = np.fromiter(chain.from_iterable(chain([first], rows)), dtype=np.float32)
+    return flat.reshape(-1, len(first))
+
+
+def _row_values(row):
+    """Upsert values for one matrix row: numpy rows (the client lists them), array("f") rows as lists."""
+    return row if hasattr(row, "dtype") else row.tolist()
+
+
+def _upsert_parallel(index, chunks: List[str], embeddings, to_vector: Callable[[int, str, List[float]], Dict],
+                     offset: int = 0, batch_size: int = PINECONE_UPSERT_BATCH) -> int:
+    """
+    Upsert all batches on the index's thread pool, paced by the upsert
+    byte budget, then wait. `embeddings` is a packed matrix (see
+    `_as_matrix`); each batch's vector records are built just before it
+    is sent, so only one batch of rows is expanded at a time. numpy rows
+    are passed as-is; the Pinecone client still turns each into a Python
+    list (tolist) while building the request, so this is not zero-copy.
+    A failed batch is logged and skipped; returns the vectors written.
+    """
+    pending = []
+    for i in range(0, len(chunks), batch_size):
+        batch = [
+            to_vector(offset + j, chunks[j], _row_values(embeddings[j]))
+            for j in range(i, min(i + batch_size, len(chunks)))
+        ]
+        _UPSERT_LIMITER.acquire(_upsert_bytes(batch))
+        pending.append((len(batch), index.upsert(vectors=batch, async_req=True)))
+    written = 0
+    for size, result in pending:
+        try:
+            _wait_upsert(result)
+            written += size
+        except Exception as e:
+            logger.error(f"Pinecone upsert batch failed ({size} vectors): {e}")
+    return written
+
+
+async def _aindex_chunks(index, chunks: List[str], to_vector: Callable[[int, str, List[float]], Dict],
+                         upsert_workers: int = PINECONE_UPSERT_WORKERS) -> int:
+    """
+    Embed and upsert as a pipeline. Embedding workers push each batch of
+    vectors onto a bounded queue as soon as OpenAI returns it, and upsert
+    workers drain it into Pinecone, so the two services' round trips
+    overlap and only a few batches of vectors are held at once.
+    Returns the number of vectors written.
+    """
+    from openai import AsyncOpenAI
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=4)
+    starts = iter(range(0, len(chunks), EMBED_BATCH_SIZE))
+    written = 0
+
+    async with AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=EMBED_MAX_RETRIES) as client:
+        async def embed_worker():
+            for start in starts:
+                batch = chunks[start:start + EMBED_BATCH_SIZE]
+                cached, misses = _cached_embeddings(batch)
+                fresh = []
+                if misses:
+                    await _EMBED_LIMITER.acquire_async(_batch_tokens(misses))
+                    response = await client.embeddings.create(model=EMBED_MODEL, input=misses)
+                    fresh = [r.embedding for r in response.data]
+                embeddings = _merge_embeddings(cached, misses, fresh)
+                await queue.put([
+                    to_vector(start + j, chunk, emb)
+                    for j, (chunk, emb) in enumerate(zip(batch, embeddings))
+                ])
+
+        async def upsert_worker():
+            nonlocal written
+            while True:
+                vectors = await queue.get()
+                if vectors is None:
+                    return
+                for i in range(0, len(vectors), PINECONE_UPSERT_BATCH):
+                    batch = vectors[i:i + PINECONE_UPSERT_BATCH]
+                    await _UPSERT_LIMITER.acquire_async(_upsert_bytes(batch))
+                    try:
+                        # The Pinecone client is sync; keep the loop free for embedding
+                        await asyncio.to_thread(index.upsert, vectors=batch)
+                        written += len(batch)
+                    except Exception as e:
+                        logger.error(f"Pinecone upsert batch failed ({len(batch)} vectors): {e}")
+
+        upserters = [asyncio.create_task(upsert_worker()) for _ in range(max(1, upsert_workers))]
+        try:
+            await asyncio.gather(*(embed_worker() for _ in range(max(1, EMBED_CONCURRENCY))))
+        finally:
+            for _ in upserters:
+                await queue.put(None)
+            await asyncio.gather(*upserters)
+    return written
+
+
+def _vector_id(doc_hash: str, i: int, chunk: str) -> str:
+    """
+    `{doc_hash}_{i}_{text hash}`: the chunk text is part of the ID, so
+    re-chunking a document (new CHUNK_SIZE/overlap or merge rules) yields
+    new IDs instead of matching the stale vectors at the same positions.
+    """
+    return f"{doc_hash}_{i}_{hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:8]}"
+
+
+_FETCH_BATCH = 200  # IDs per fetch; REST fetch sends them in the query string
 
-    # Create index if it doesn't exist
-    existing = [idx.name for idx in pc.list_indexes()]
-    if PINECONE_INDEX not in existing:
-        pc.create_index(
-            name=PINECONE_INDEX,
-            dimension=1536,  # text-embedding-ada-002 dimension
-            metric="cosine",
-            spec=ServerlessSpec(cloud="aws", region=PINECONE_ENV)
-        )
-        logger.info(f"Created Pinecone index: {PINECONE_INDEX}")
 
-    return pc.Index(PINECONE_INDEX)
+def _present_ids(index, ids: List[str], patient_id: str) -> set:
+    """
+    IDs already in the index for this patient. Chunk IDs are derived from
+    the document and chunk text hashes, so a present ID means the chunk
+    is unchanged. Errors
+    are logged and treated as "nothing present" (everything is upserted).
+    """
+    present = set()
+    try:
+        for i in range(0, len(ids), _FETCH_BATCH):
+            vectors = index.fetch(ids=ids[i:i + _FETCH_BATCH]).vectors or {}
+            present.update(
+                vid for vid, vec in vectors.items()
+                if (getattr(vec, "metadata", None) or {}).get("patient_id") == patient_id
+            )
+    except Exception as e:
+        logger.warning(f"Pinecone fetch failed, re-indexing window: {e}")
+        return set()
+    return present
+
+
+def _vector_factory(metadata: Dict, patient_id: str,
+                    total_chunks: Optional[int]) -> Callable[[int, str, List[float]], Dict]:
+    """Build Pinecone vector records for one document's chunks."""
+    doc_hash = metadata.get("hash", "unknown")
+
+    def to_vector(i: int, chunk: str, emb: List[float]) -> Dict:
+        return {
+            "id": _vector_id(doc_hash, i, chunk),
+            "values": emb,
+            "metadata": {
+                "text": chunk[:500],     # Pinecone metadata limit
+                "patient_id": patient_id,
+                "filename": metadata.get("filename", "unknown"),
+                "chunk_index": i,
+                "total_chunks": total_chunks
+            }
+        }
+    return to_vector
 
 
 def index_document(raw_text: str, metadata: Dict, patient_id: str = "anonymous") -> int:
@@ -188,36 +998,69 @@ def index_document(raw_text: str, metadata: Dict, patient_id: str = "anonymous")
     Chunk, embed, and upsert document into Pinecone.
     Returns the number of vectors upserted.
     """
-    try:
-        chunks = chunk_text(raw_text)
-        if not chunks:
-            return 0
+    return index_chunks(chunk_text(raw_text), metadata, patient_id)
 
-        embeddings = get_embeddings(chunks)
-        index = get_pinecone_index()
 
-        doc_hash = metadata.get("hash", "unknown")
-        vectors = []
-        for i, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-            vectors.append({
-                "id": f"{doc_hash}_{i}",
-                "values": emb,
-                "metadata": {
-                    "text": chunk[:500],     # Pinecone metadata limit
-                    "patient_id": patient_id,
-                    "filename": metadata.get("filename", "unknown"),
-                    "chunk_index": i,
-                    "total_chunks": len(chunks)
-                }
-            })
-
-        # Upsert in batches of 100
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            index.upsert(vectors=vectors[i:i + batch_size])
-
-        logger.info(f"Indexed {len(vectors)} vectors into Pinecone")
-        return len(vectors)
+def _index_window(index, window: List[str], offset: int, to_vector,
+                  doc_hash: Optional[str] = None, patient_id: str = "anonymous") -> Tuple[int, int]:
+    """
+    Embed and upsert one window of chunks whose first chunk is number
+    `offset`. With a `doc_hash`, chunks whose IDs are already indexed for
+    this patient are skipped. Returns (vectors written, vectors skipped).
+    """
+    positions = list(range(offset, offset + len(window)))
+    skipped = 0
+    if doc_hash is not None:
+        ids = [_vector_id(doc_hash, p, chunk) for p, chunk in zip(positions, window)]
+        present = _present_ids(index, ids, patient_id)
+        if present:
+            keep = [k for k, vid in enumerate(ids) if vid not in present]
+            skipped = len(window) - len(keep)
+            window = [window[k] for k in keep]
+            positions = [positions[k] for k in keep]
+
+    def shifted(i: int, chunk: str, emb: List[float]) -> Dict:
+        return to_vector(positions[i], chunk, emb)
+
+    if not window:
+        return 0, skipped
+    if len(window) > EMBED_BATCH_SIZE and not _in_event_loop():
+        return asyncio.run(_aindex_chunks(index, window, shifted)), skipped
+    return _upsert_parallel(index, window, _as_matrix(get_embeddings(window)), shifted), skipped
+
+
+def index_chunks(chunks: Iterable[str], metadata: Dict, patient_id: str = "anonymous",
+                 total_chunks: Optional[int] = None) -> int:
+    """
+    Embed and upsert already-chunked text; see `index_document`.
+
+    `chunks` may be a generator: it is consumed INGEST_CHUNKS_IN_FLIGHT at
+    a time, so large files never sit in memory whole. Pass `total_chunks`
+    for the vector metadata when it isn't a list.
+
+    Chunk IDs derive from the document and chunk text hashes, so chunks already
+    indexed for this patient are skipped (one fetch per window) and count
+    towards the returned total; unchanged re-ingests embed nothing.
+    """
+    try:
+        if isinstance(chunks, list):
+            total_chunks = len(chunks)
+        doc_hash = metadata.get("hash")
+        index = to_vector = None
+        written = skipped = seen = 0
+        for window in _windows(chunks, INGEST_CHUNKS_IN_FLIGHT):
+            if index is None:
+                index = get_pinecone_index()
+                to_vector = _vector_factory(metadata, patient_id, total_chunks)
+            new, present = _index_window(index, window, seen, to_vector, doc_hash, patient_id)
+            written += new
+            skipped += present
+            seen += len(window)
+
+        if seen:
+            logger.info(f"Indexed {written}/{seen - skipped} vectors into Pinecone"
+                        f" ({skipped} already present)")
+        return written + skipped
 
     except Exception as e:
         logger.error(f"Pinecone indexing failed: {e}")
@@ -233,6 +1076,13 @@ def ingest_medical_knowledge_base(data_dir: str = "./data"):
     Bulk ingest all medical knowledge base files.
     Run once to populate Pinecone with PubMed, DrugBank, Hetionet data.
 
+    Files are streamed: a first pass hashes and counts chunks, then chunks
+    are re-read and embedded a window at a time. Loads with
+    EMBED_BATCH_API_MIN_CHUNKS or more chunks not yet in the embedding
+    store send those chunks (only) through the OpenAI Batch API and merge
+    them back with the stored vectors; smaller ones use the real-time
+    pipeline file by file.
+
     Usage:
         python -c "from ingestion import ingest_medical_knowledge_base; ingest_medical_knowledge_base()"
     """
@@ -242,54 +1092,187 @@ def ingest_medical_knowledge_base(data_dir: str = "./data"):
 
     supported = [".txt", ".csv", ".pdf", ".json", ".tsv"]
 
+    documents = []  # (file_path, metadata, chunk count)
+    uncached = 0
     for file_path in data_path.rglob("*"):
         if file_path.suffix.lower() not in supported:
             continue
 
-        logger.info(f"Ingesting: {file_path.name}")
+        logger.info(f"Reading: {file_path.name}")
         try:
-            if file_path.suffix == ".csv" or file_path.suffix == ".tsv":
-                text = _ingest_csv(file_path)
-            elif file_path.suffix == ".json":
-                text = _ingest_json(file_path)
-            else:
-                text = file_path.read_text(encoding="utf-8", errors="ignore")
-
             metadata = {
                 "filename": file_path.name,
                 "source": file_path.parent.name,
-                "hash": hashlib.sha256(text.encode()).hexdigest()[:16],
+                "hash": _file_hash(file_path),
             }
-            count = index_document(text, metadata, patient_id="knowledge_base")
-            total_vectors += count
-            logger.info(f"  ✓ {count} vectors from {file_path.name}")
+            count = 0
+            for window in _windows(_iter_file_chunks(file_path), INGEST_CHUNKS_IN_FLIGHT):
+                count += len(window)
+                uncached += len(_cached_embeddings(window)[1])
+            if count:
+                documents.append((file_path, metadata, count))
         except Exception as e:
             logger.error(f"  ✗ Failed {file_path.name}: {e}")
 
+    # Chunks already in the embedding store (earlier or interrupted runs)
+    # are free on the real-time path, so only new ones justify a batch job
+    embeddings = None
+    miss_flags: Dict[Path, bytearray] = {}  # per chunk: 1 = sent to the batch job
+
+    def batch_inputs() -> Iterator[str]:
+        for file_path, _, _ in documents:
+            flags = miss_flags[file_path] = bytearray()
+            for window in _windows(_iter_file_chunks(file_path), INGEST_CHUNKS_IN_FLIGHT):
+                for chunk, vec in zip(window, _cached_embeddings(window)[0]):
+                    flags.append(vec is None)
+                    if vec is None:
+                        yield chunk
+
+    if uncached >= EMBED_BATCH_API_MIN_CHUNKS:
+        try:
+            embeddings = embed_with_batch_api(batch_inputs())
+        except Exception as e:
+            logger.error(f"Batch API embedding failed, using real-time path: {e}")
+
+    if embeddings is not None:
+        index = get_pinecone_index()
+        store = get_embedding_store()
+        for file_path, metadata, total in documents:
+            to_vector = _vector_factory(metadata, "knowledge_base", total)
+            flags = miss_flags[file_path]
+            # The batch stream holds only this file's misses, in chunk order
+            file_embeddings = islice(embeddings, sum(flags))
+            count = 0
+            try:
+                offset = 0
+                for window in _windows(_iter_file_chunks(file_path), INGEST_CHUNKS_IN_FLIGHT):
+                    window_flags = flags[offset:offset + len(window)]
+                    hits = [chunk for chunk, miss in zip(window, window_flags) if not miss]
+                    cached = iter(store.get_many(hits) if hits else [])
+                    matrix = _as_matrix(
+                        next(file_embeddings) if miss else next(cached) for miss in window_flags
+                    )
+                    count += _upsert_parallel(index, window, matrix, to_vector, offset)
+                    offset += len(window)
+                logger.info(f"  ✓ {count} vectors from {file_path.name}")
+            except Exception as e:
+                logger.error(f"  ✗ Failed {file_path.name}: {e}")
+            # Keep the shared embedding stream aligned with the next file
+            deque(file_embeddings, maxlen=0)
+            total_vectors += count
+    else:
+        for file_path, metadata, total in documents:
+            count = index_chunks(_iter_file_chunks(file_path), metadata,
+                                 patient_id="knowledge_base", total_chunks=total)
+            total_vectors += count
+            logger.info(f"  ✓ {count} vectors from {file_path.name}")
+
     logger.info(f"\n✅ Total vectors ingested: {total_vectors}")
+
+    # Knowledge base changed - cached agent answers may be stale
+    if total_vectors:
+        from agents import get_response_cache
+        get_response_cache().invalidate()
+
     return total_vectors
 
 
-def _ingest_csv(file_path: Path) -> str:
-    """Convert CSV/TSV rows to text for embedding."""
+def build_local_drug_index(data_dir: str = "./data/drugbank") -> int:
+    """
+    Mirror DrugBank files into the local sqlite-vec index used by
+    `drugbank_medication_lookup`, so drug lookups skip Pinecone. The index
+    is rebuilt from scratch, so re-running never duplicates rows.
+
+    Usage:
+        python -c "from ingestion import build_local_drug_index; build_local_drug_index()"
+    """
+    from retriever import LocalVectorIndex
+
+    index = LocalVectorIndex("drugbank")
+    index.clear()
+    total = 0
+    for file_path in Path(data_dir).rglob("*"):
+        if file_path.suffix.lower() not in (".csv", ".tsv", ".json", ".txt"):
+            continue
+        count = 0
+        for window in _windows(_iter_file_chunks(file_path), INGEST_CHUNKS_IN_FLIGHT):
+            index.add(window, get_embeddings(window))
+            count += len(window)
+        if count:
+            total += count
+            logger.info(f"  ✓ {count} local vectors from {file_path.name}")
+
+    logger.info(f"✅ Local DrugBank index: {total} vectors")
+    return total
+
+
+def _iter_csv_rows(file_path: Path) -> Iterator[str]:
+    """Yield CSV/TSV rows as "key: value | ..." text, one at a time."""
     import csv
-    sep = "\t" if file_path.suffix == ".tsv" else ","
-    rows = []
-    with open(file_path, encoding="utf-8", errors="ignore") as f:
-        reader = csv.DictReader(f, delimiter=sep)
-        for row in reader:
-            rows.append(" | ".join(f"{k}: {v}" for k, v in row.items() if v))
-    return "\n".join(rows)
-
-
-def _ingest_json(file_path: Path) -> str:
-    """Flatten JSON to text for embedding."""
-    import json
-    with open(file_path, encoding="utf-8") as f:
-        data = json.load(f)
+    sep = "\t" if file_path.suffix.lower() == ".tsv" else ","
+    with open(file_path, encoding="utf-8", errors="ignore", newline="") as f:
+        for row in csv.DictReader(f, delimiter=sep):
+            yield " | ".join(f"{k}: {v}" for k, v in row.items() if v)
+
+
+def _iter_json_rows(file_path: Path) -> Iterator[str]:
+    """
+    Yield the items of a top-level JSON list as JSON strings, parsed
+    incrementally with ijson when installed. Any other document is one row.
+    """
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+
+    with open(file_path, "rb") as f:
+        head = f.read(4096).lstrip()
+        f.seek(0)
+        if ijson is not None and head.startswith(b"["):
+            for item in ijson.items(f, "item", use_float=True):
+                yield _row_json(item)
+            return
+        data = _json_loads(f.read())
     if isinstance(data, list):
-        return "\n".join(json.dumps(item) for item in data)
-    return json.dumps(data, indent=2)
+        for item in data:
+            yield _row_json(item)
+    else:
+        yield _row_json(data, indent=True)
+
+
+def _chunk_rows(rows: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    Pack rows into newline-joined chunks of up to `chunk_size` chars as they
+    stream in. A row longer than a chunk is split with `chunk_text`.
+    """
+    parts: List[str] = []
+    size = 0
+    for row in rows:
+        if not row:
+            continue
+        if len(row) > chunk_size:
+            if parts:
+                yield "\n".join(parts)
+                parts, size = [], 0
+            yield from chunk_text(row, chunk_size)
+            continue
+        if parts and size + 1 + len(row) > chunk_size:
+            yield "\n".join(parts)
+            parts, size = [], 0
+        size += len(row) + (1 if parts else 0)
+        parts.append(row)
+    if parts:
+        yield "\n".join(parts)
+
+
+def _iter_file_chunks(file_path: Path) -> Iterator[str]:
+    """Chunks of a knowledge-base file; CSV/TSV/JSON are streamed row by row."""
+    suffix = file_path.suffix.lower()
+    if suffix in (".csv", ".tsv"):
+        return _chunk_rows(_iter_csv_rows(file_path))
+    if suffix == ".json":
+        return _chunk_rows(_iter_json_rows(file_path))
+    return iter(chunk_text(file_path.read_text(encoding="utf-8", errors="ignore")))
 
 
 if __name__ == "__main__":
@@ -5,12 +5,24 @@
 ╚══════════════════════════════════════════════════════════════╝
 """
 
+import re
+import math
+import time
+import array
+import hashlib
 import logging
-from typing import List, Optional, Dict, Any
+import threading
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import accumulate
+from typing import Callable, List, Optional, Dict, Any, Tuple
 
 from config import (
-    OPENAI_API_KEY, PINECONE_API_KEY, PINECONE_ENV,
-    PINECONE_INDEX, EMBED_MODEL, TOP_K_RETRIEVAL
+    PINECONE_ENV, EMBED_MODEL, TOP_K_RETRIEVAL,
+    SEARCH_BATCH_SIZE, SEARCH_BATCH_WAIT_MS, EMBED_CACHE_SIZE,
+    EMBED_DIMENSION, LOCAL_VECTOR_DB, LLM_MODEL, REPORT_CONTEXT_TOKENS
 )
 
 logger = logging.getLogger(__name__)
@@ -20,6 +32,10 @@ logger = logging.getLogger(__name__)
 # LangChain Pinecone Retriever
 # ──────────────────────────────────────────────────────────────
 
+_RETRIEVERS: Dict[str, Any] = {}
+_RETRIEVERS_LOCK = threading.Lock()
+
+
 def get_retriever(namespace: str = "medical_kb"):
     """
     Build and return a LangChain VectorStoreRetriever backed by Pinecone.
@@ -27,23 +43,27 @@ def get_retriever(namespace: str = "medical_kb"):
     Uses text-embedding-ada-002 for dense retrieval.
     namespace="medical_kb" for knowledge base
     namespace="patient_memory" for patient history
+
+    Retrievers are cached per namespace. The shared mock fallback is not
+    cached, so a later call can still connect once Pinecone is reachable.
     """
-    try:
-        from langchain_pinecone import PineconeVectorStore
-        from langchain_openai import OpenAIEmbeddings
-        from pinecone import Pinecone
+    with _RETRIEVERS_LOCK:
+        retriever = _RETRIEVERS.get(namespace)
+        if retriever is None:
+            retriever = _build_retriever(namespace)
+            if not isinstance(retriever, MockRetriever):
+                _RETRIEVERS[namespace] = retriever
+    return retriever
 
-        embeddings = OpenAIEmbeddings(
-            model=EMBED_MODEL,
-            openai_api_key=OPENAI_API_KEY
-        )
 
-        pc = Pinecone(api_key=PINECONE_API_KEY)
-        index = pc.Index(PINECONE_INDEX)
+def _build_retriever(namespace: str):
+    try:
+        from langchain_pinecone import PineconeVectorStore
+        from clients import get_openai_embeddings, get_pinecone_index_handle
 
         vectorstore = PineconeVectorStore(
-            index=index,
-            embedding=embeddings,
+            index=get_pinecone_index_handle(),
+            embedding=get_openai_embeddings(),
             text_key="text",
             namespace=namespace
         )
@@ -57,10 +77,10 @@ def get_retriever(namespace: str = "medical_kb"):
 
     except ImportError as e:
         logger.warning(f"Pinecone/LangChain not installed: {e}")
-        return MockRetriever()
+        return _MOCK_RETRIEVER
     except Exception as e:
         logger.warning(f"Pinecone connection failed (using mock): {e}")
-        return MockRetriever()
+        return _MOCK_RETRIEVER
 
 
 # ──────────────────────────────────────────────────────────────
@@ -74,16 +94,11 @@ def get_patient_memory_retriever(patient_id: str):
     """
     try:
         from langchain_pinecone import PineconeVectorStore
-        from langchain_openai import OpenAIEmbeddings
-        from pinecone import Pinecone
-
-        embeddings = OpenAIEmbeddings(model=EMBED_MODEL, openai_api_key=OPENAI_API_KEY)
-        pc = Pinecone(api_key=PINECONE_API_KEY)
-        index = pc.Index(PINECONE_INDEX)
+        from clients import get_openai_embeddings, get_pinecone_index_handle
 
         vectorstore = PineconeVectorStore(
-            index=index,
-            embedding=embeddings,
+            index=get_pinecone_index_handle(),
+            embedding=get_openai_embeddings(),
             text_key="text",
             namespace=f"patient_{patient_id}"
         )
@@ -116,25 +131,571 @@ class HybridRetriever:
     for better precision on medical terminology.
     """
 
+    RRF_K = 60  # Reciprocal-rank-fusion damping constant
+
     def __init__(self, namespace: str = "medical_kb"):
         self.dense_retriever = get_retriever(namespace)
-        self.bm25 = None
-        self._init_bm25()
-
-    def _init_bm25(self):
-        try:
-            from rank_bm25 import BM25Okapi
-            self.bm25_class = BM25Okapi
-            logger.info("BM25 sparse retriever ready")
-        except ImportError:
-            logger.warning("rank_bm25 not installed. Using dense-only retrieval.")
 
     def similarity_search(self, query: str, k: int = 5) -> List[Any]:
         """
-        Hybrid search: merge dense + sparse results with RRF scoring.
+        Hybrid search: BM25-score the dense candidates (TOP_K_RETRIEVAL of
+        them) against the query and merge both rankings with RRF scoring.
         """
-        dense_results = self.dense_retriever.get_relevant_documents(query)[:k]
-        return dense_results  # Extend with BM25 results in production
+        candidates = self.dense_retriever.get_relevant_documents(query)
+        if len(candidates) <= 1:
+            return candidates[:k]
+        sparse = _bm25_scores([doc.page_content for doc in candidates], query)
+        sparse_rank = {d: r for r, d in enumerate(sorted(range(len(candidates)), key=lambda d: -sparse[d]))}
+        fused = sorted(
+            range(len(candidates)),
+            key=lambda d: -(1 / (self.RRF_K + d) + 1 / (self.RRF_K + sparse_rank[d]))
+        )
+        return [candidates[d] for d in fused[:k]]
+
+
+# ──────────────────────────────────────────────────────────────
+# Prompt Context Selection (token budget)
+# ──────────────────────────────────────────────────────────────
+
+_REPORT_HINTS = "impression assessment diagnosis findings abnormal elevated high low positive result"
+
+
+@lru_cache(maxsize=1)
+def _token_encoder():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(LLM_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Token count for LLM_MODEL (~4 chars/token estimate without tiktoken)."""
+    encoder = _token_encoder()
+    if encoder is None:
+        return len(text) // 4 + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+_BM25_K1, _BM25_B, _BM25_EPSILON = 1.5, 0.75, 0.25  # rank_bm25.BM25Okapi defaults
+
+
+_prange = range  # numba.prange once `_bm25_kernel` compiles `_bm25_loop`
+
+
+def _bm25_loop(tf, doc_len, idf, avgdl, k1, b, out):
+    """BM25 over a (docs x query terms) frequency matrix, one document per (parallel) iteration."""
+    n_docs, n_terms = tf.shape
+    for d in _prange(n_docs):
+        norm = k1 * (1 - b + b * doc_len[d] / avgdl)
+        total = 0.0
+        for t in range(n_terms):
+            total += idf[t] * tf[d, t] * (k1 + 1) / (tf[d, t] + norm)
+        out[d] = total
+
+
+@lru_cache(maxsize=1)
+def _bm25_kernel():
+    """
+    numba-compiled `_bm25_loop`, or None without numba. Compiled code is
+    cached on disk (cache=True), so only the first process pays the JIT.
+    """
+    global _prange
+    try:
+        import numba
+    except ImportError:
+        return None
+    _prange = numba.prange
+    return numba.njit(parallel=True, cache=True)(_bm25_loop)
+
+
+def _bm25_scores_fast(docs: List[List[str]], query_terms: List[str], kernel) -> List[float]:
+    """
+    BM25Okapi scores with the per-document loop in `kernel`. Only the
+    query terms' frequencies are materialised, as a (docs x terms) float32
+    matrix; IDF follows rank_bm25, including its epsilon floor.
+    """
+    import numpy as np
+
+    df: Counter = Counter()
+    for doc in docs:
+        df.update(set(doc))
+    n = len(docs)
+    idfs = {w: math.log(n - f + 0.5) - math.log(f + 0.5) for w, f in df.items()}
+    floor = _BM25_EPSILON * sum(idfs.values()) / max(len(idfs), 1)
+    idf = np.array([floor if idfs.get(t, 0.0) < 0 else idfs.get(t, 0.0) for t in query_terms],
+                   dtype=np.float32)
+    tf = np.zeros((n, len(query_terms)), dtype=np.float32)
+    for d, doc in enumerate(docs):
+        counts = Counter(doc)
+        tf[d] = [counts[t] for t in query_terms]
+    doc_len = np.array([len(doc) for doc in docs], dtype=np.float32)
+    out = np.zeros(n, dtype=np.float64)
+    kernel(tf, doc_len, idf, float(doc_len.mean()) or 1.0, _BM25_K1, _BM25_B, out)
+    return out.tolist()
+
+
+def _bm25_scores(chunks: List[str], query: str) -> List[float]:
+    query_terms = _tokenize(query)
+    kernel = _bm25_kernel()
+    if kernel is not None and query_terms and chunks:
+        return _bm25_scores_fast([_tokenize(c) for c in chunks], query_terms, kernel)
+    try:
+        from rank_bm25 import BM25Okapi
+        return list(BM25Okapi([_tokenize(c) for c in chunks]).get_scores(query_terms))
+    except ImportError:
+        terms = set(query_terms)
+        return [float(sum(t in terms for t in _tokenize(c))) for c in chunks]
+
+
+def select_relevant_chunks(text: str, query: str = "",
+                           max_tokens: int = REPORT_CONTEXT_TOKENS) -> str:
+    """
+    Fit a report into `max_tokens` for a prompt.
+
+    Reports within budget are returned unchanged. Longer ones are chunked;
+    the first chunk (header, patient details) is always kept and the rest
+    are ranked by BM25 against `query` plus common report-finding terms,
+    then added best-first until the budget is spent. Selected chunks are
+    returned in document order, with "[...]" marking the gaps.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    from ingestion import chunk_text
+    chunks = chunk_text(text, overlap=0)
+    scores = _bm25_scores(chunks, f"{query} {_REPORT_HINTS}")
+    order = [0] + sorted(range(1, len(chunks)), key=lambda i: scores[i], reverse=True)
+
+    keep, used = [], 0
+    for i in order:
+        cost = count_tokens(chunks[i])
+        if used + cost <= max_tokens:
+            keep.append(i)
+            used += cost
+    logger.info(f"Report trimmed to {len(keep)}/{len(chunks)} chunks (~{used} tokens)")
+    return "\n[...]\n".join(chunks[i] for i in sorted(keep))
+
+
+# ──────────────────────────────────────────────────────────────
+# Local Vector Index (sqlite-vec)
+# ──────────────────────────────────────────────────────────────
+
+class LocalDocument:
+    def __init__(self, content: str, metadata: Dict[str, Any]):
+        self.page_content = content
+        self.metadata = metadata
+
+
+class LocalVectorIndex:
+    """
+    KNN over a static collection stored in a sqlite-vec `vec0` table.
+    Used for small, rarely-changing corpora (DrugBank) to skip the Pinecone
+    round-trip. Requires `pip install sqlite-vec`.
+    """
+
+    def __init__(self, name: str, db_path=LOCAL_VECTOR_DB, dimension: int = EMBED_DIMENSION):
+        import sqlite3
+        import sqlite_vec
+
+        self.name = name
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.enable_load_extension(True)
+        sqlite_vec.load(self._db)
+        self._db.enable_load_extension(False)
+        self._serialize = sqlite_vec.serialize_float32
+        self._db.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {name}_vec USING vec0(embedding float[{dimension}])"
+        )
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {name}_docs (rowid INTEGER PRIMARY KEY, text TEXT NOT NULL)"
+        )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute(f"SELECT count(*) FROM {self.name}_docs").fetchone()[0]
+
+    def clear(self) -> None:
+        """Drop every document, so a rebuild does not duplicate rows."""
+        with self._lock, self._db:
+            self._db.execute(f"DELETE FROM {self.name}_vec")
+            self._db.execute(f"DELETE FROM {self.name}_docs")
+
+    def add(self, texts: List[str], vectors: List[List[float]]) -> None:
+        with self._lock, self._db:
+            for text, vec in zip(texts, vectors):
+                cur = self._db.execute(f"INSERT INTO {self.name}_docs (text) VALUES (?)", (text,))
+                self._db.execute(
+                    f"INSERT INTO {self.name}_vec (rowid, embedding) VALUES (?, ?)",
+                    (cur.lastrowid, self._serialize(vec)),
+                )
+
+    def search_by_vector(self, vector: List[float], k: int = 5) -> List[LocalDocument]:
+        with self._lock:
+            rows = self._db.execute(
+                f"""
+                SELECT d.text, v.distance
+                FROM {self.name}_vec v JOIN {self.name}_docs d ON d.rowid = v.rowid
+                WHERE v.embedding MATCH ? AND k = ?
+                ORDER BY v.distance
+                """,
+                (self._serialize(vector), k),
+            ).fetchall()
+        return [
+            LocalDocument(text, {"source": f"sqlite-vec:{self.name}", "distance": distance})
+            for text, distance in rows
+        ]
+
+
+_LOCAL_INDEXES: Dict[str, Optional[LocalVectorIndex]] = {}
+
+
+def get_local_index(name: str) -> Optional[LocalVectorIndex]:
+    """Return the populated local index `name`, or None if unavailable."""
+    with _RETRIEVERS_LOCK:
+        if name not in _LOCAL_INDEXES:
+            index = None
+            if LOCAL_VECTOR_DB.exists():
+                try:
+                    index = LocalVectorIndex(name)
+                    if index.count() == 0:
+                        index = None
+                except ImportError:
+                    logger.info("sqlite-vec not installed - using Pinecone for all lookups")
+                except Exception as e:
+                    logger.warning(f"Local vector index '{name}' unavailable: {e}")
+            _LOCAL_INDEXES[name] = index
+        return _LOCAL_INDEXES[name]
+
+
+# ──────────────────────────────────────────────────────────────
+# Query Embedding (deduped + cached)
+# ──────────────────────────────────────────────────────────────
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU of query embeddings keyed by SHA-256 of model + text.
+
+    Vectors are held as packed float32 arrays (~6 KB for ada-002) rather
+    than lists of Python floats (~49 KB). They are still sent to Pinecone,
+    so they are not quantized any further.
+    """
+
+    def __init__(self, max_size: int = EMBED_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, array.array]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(f"{EMBED_MODEL}\x00{text}".encode()).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = self._key(text)
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is None:
+                return None
+            self._entries.move_to_end(key)
+        return vec.tolist()
+
+    def put(self, text: str, vec: List[float]) -> None:
+        key = self._key(text)
+        packed = array.array("f", vec)
+        with self._lock:
+            self._entries[key] = packed
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_EMBED_CACHE = EmbeddingCache()
+
+
+class Embedder:
+    """
+    Embeds query strings through a shared cache.
+    Duplicates are dropped and all cache misses go out in a single API call.
+    """
+
+    MAX_BATCH = 2048  # OpenAI embeddings input limit
+
+    def __init__(self, embed_documents: Callable[[List[str]], List[List[float]]],
+                 cache: EmbeddingCache = _EMBED_CACHE):
+        self.embed_documents = embed_documents
+        self.cache = cache
+
+    def embed_queries_batch(self, texts: List[str]) -> List[List[float]]:
+        vectors = {}
+        misses = []
+        for text in dict.fromkeys(texts):
+            vec = self.cache.get(text)
+            if vec is None:
+                misses.append(text)
+            else:
+                vectors[text] = vec
+        for i in range(0, len(misses), self.MAX_BATCH):
+            batch = misses[i:i + self.MAX_BATCH]
+            for text, vec in zip(batch, self.embed_documents(batch)):
+                self.cache.put(text, vec)
+                vectors[text] = vec
+        return [vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries_batch([text])[0]
+
+
+def get_embedder(retriever) -> Optional[Embedder]:
+    """Return a cached Embedder for the embeddings behind a LangChain retriever, if any."""
+    vectorstore = getattr(retriever, "vectorstore", None)
+    embeddings = getattr(vectorstore, "embeddings", None)
+    if embeddings is None:
+        return None
+    return Embedder(embeddings.embed_documents)
+
+
+# ──────────────────────────────────────────────────────────────
+# Batched Search
+# ──────────────────────────────────────────────────────────────
+
+def batch_similarity_search(retriever, queries: List[str], k: int = 5,
+                            embedder: Optional[Embedder] = None) -> List[List[Any]]:
+    """
+    Run several similarity searches, embedding all queries in one API call.
+    Returns one document list per query, in query order.
+    """
+    if hasattr(retriever, "batch_similarity_search"):
+        return retriever.batch_similarity_search(queries, k=k)
+
+    vectorstore = getattr(retriever, "vectorstore", None)
+    if vectorstore is not None:
+        embedder = embedder or get_embedder(retriever)
+        vectors = embedder.embed_queries_batch(queries)
+        if len(vectors) == 1:
+            return [vectorstore.similarity_search_by_vector(vectors[0], k=k)]
+        # Pinecone takes one vector per query request - issue them concurrently
+        with ThreadPoolExecutor(max_workers=min(len(vectors), SEARCH_BATCH_SIZE)) as pool:
+            return list(pool.map(lambda v: vectorstore.similarity_search_by_vector(v, k=k), vectors))
+
+    return [retriever.similarity_search(q, k=k) for q in queries]
+
+
+class SearchBatcher:
+    """
+    Coalesces concurrent similarity searches into batched retriever calls.
+
+    The first caller to arrive waits up to `max_wait_ms` for others to join,
+    then flushes everything pending; a caller that fills the batch flushes it
+    immediately. Each caller blocks only on its own result.
+    """
+
+    def __init__(self, retriever, batch_size: int = SEARCH_BATCH_SIZE,
+                 max_wait_ms: int = SEARCH_BATCH_WAIT_MS, embedder: Optional[Embedder] = None):
+        self.retriever = retriever
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[str, int, Future]] = []
+        self._leader = False
+        self._cond = threading.Condition()
+
+    def search(self, query: str, k: int = 5) -> List[Any]:
+        future: Future = Future()
+        batch = []
+        with self._cond:
+            self._pending.append((query, k, future))
+            if len(self._pending) >= self.batch_size:
+                batch, self._pending = self._pending, []
+                self._cond.notify_all()
+            elif not self._leader:
+                self._leader = True
+                deadline = time.monotonic() + self.max_wait
+                while self._pending and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+                self._leader = False
+        if batch:
+            self._flush(batch)
+        return future.result()
+
+    def _flush(self, batch: List[Tuple[str, int, Future]]) -> None:
+        by_k: Dict[int, List[Tuple[str, Future]]] = {}
+        for query, k, future in batch:
+            by_k.setdefault(k, []).append((query, future))
+        for k, items in by_k.items():
+            try:
+                results = batch_similarity_search(
+                    self.retriever, [q for q, _ in items], k=k, embedder=self.embedder
+                )
+                for (_, future), docs in zip(items, results):
+                    future.set_result(docs)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+
+
+# ──────────────────────────────────────────────────────────────
+# Query Cache (LRU + TTL, exact and semantic match)
+# ──────────────────────────────────────────────────────────────
+
+class QueryCache:
+    """
+    Thread-safe LRU + TTL cache for retrieval results.
+
+    Lookups try an exact match on the normalized query first. If an
+    embedding function is supplied (and numpy is installed) they fall back
+    to the most similar cached query above `similarity_threshold`, so
+    rephrasings like "metformin mechanism" / "mechanism of metformin" hit.
+    Namespaces in `EXACT_NAMESPACES` (drug lookups) never match
+    semantically: "losartan dosage" and "valsartan dosage" embed almost
+    identically but must not share an answer.
+
+    Embeddings are stored int8-quantized with a per-vector scale. The
+    similarity scan runs on the int8 matrix and only the top
+    `RERANK_CANDIDATES` are dequantized for the exact threshold check.
+    """
+
+    RERANK_CANDIDATES = 8
+    EXACT_NAMESPACES = frozenset({"drug"})
+
+    def __init__(
+        self,
+        max_size: int = 2000,
+        ttl_seconds: int = 600,
+        enabled: bool = True,
+        similarity_threshold: float = 0.95,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.similarity_threshold = similarity_threshold
+        self.embed_fn = embed_fn
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (expires_at, namespace, value, (int8 embedding, scale) or None)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending_embeddings: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        try:
+            import numpy as np
+            self._np = np
+        except ImportError:
+            self._np = None
+
+    @staticmethod
+    def _key(query: str, namespace: str) -> str:
+        normalized = " ".join(query.lower().split())
+        return hashlib.sha256(f"{namespace}\x00{normalized}".encode()).hexdigest()
+
+    def _embed(self, query: str):
+        if self.embed_fn is None or self._np is None:
+            return None
+        try:
+            vec = self._np.asarray(self.embed_fn(query), dtype=self._np.float32)
+            norm = self._np.linalg.norm(vec)
+            return vec / norm if norm else None
+        except Exception as e:
+            logger.debug(f"Query cache embedding failed: {e}")
+            return None
+
+    def _quantize(self, embedding) -> Tuple[Any, float]:
+        np = self._np
+        scale = float(np.abs(embedding).max()) / 127 or 1.0
+        return np.round(embedding / scale).astype(np.int8), scale
+
+    def _nearest(self, embedding, namespace: str) -> Optional[str]:
+        np = self._np
+        now = time.monotonic()
+        keys, vectors, scales = [], [], []
+        for key, (expires_at, ns, _, vec) in list(self._entries.items()):
+            if expires_at < now:
+                del self._entries[key]
+            elif ns == namespace and vec is not None:
+                keys.append(key)
+                vectors.append(vec[0])
+                scales.append(vec[1])
+        if not keys:
+            return None
+
+        # Approximate scores on the int8 matrix, then rerank a shortlist exactly
+        query_q, _ = self._quantize(embedding)
+        approx = (np.stack(vectors).astype(np.int32) @ query_q.astype(np.int32)) * np.asarray(scales)
+        shortlist = np.argsort(approx)[-self.RERANK_CANDIDATES:]
+        exact = [(vectors[i].astype(np.float32) * scales[i]) @ embedding for i in shortlist]
+        best = int(np.argmax(exact))
+        return keys[shortlist[best]] if exact[best] >= self.similarity_threshold else None
+
+    def get(self, query: str, namespace: str = "") -> Optional[Any]:
+        """Return a cached value for `query`, or None on a miss."""
+        if not self.enabled:
+            return None
+        key = self._key(query, namespace)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                del self._entries[key]
+            if namespace in self.EXACT_NAMESPACES:
+                self.misses += 1
+                return None
+
+        # Embedding is a network call - keep it outside the lock
+        embedding = self._embed(query)
+        with self._lock:
+            match = self._nearest(embedding, namespace) if embedding is not None else None
+            if match is not None:
+                self._entries.move_to_end(match)
+                self.hits += 1
+                return self._entries[match][2]
+            self.misses += 1
+            if embedding is not None:
+                if len(self._pending_embeddings) >= self.max_size:
+                    self._pending_embeddings.clear()
+                self._pending_embeddings[key] = self._quantize(embedding)
+        return None
+
+    def put(self, query: str, value: Any, namespace: str = "") -> None:
+        """Store `value` for `query`, evicting least-recently-used entries."""
+        if not self.enabled:
+            return
+        key = self._key(query, namespace)
+        with self._lock:
+            embedding = self._pending_embeddings.pop(key, None)
+        if embedding is None:
+            embedding = self._embed(query)
+            if embedding is not None:
+                embedding = self._quantize(embedding)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, namespace, value, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
 
 
 # ──────────────────────────────────────────────────────────────
@@ -172,19 +733,38 @@ class MockRetriever:
         "Anatomy: Pancreas, Liver, Adipose tissue.",
     ]
 
+    def __init__(self):
+        # Docs are lowercased once into a single NUL-separated string, so a
+        # query is one regex scan; match offsets map back to docs by bisect.
+        lowered = [doc.lower() for doc in self.MOCK_DOCS]
+        self._corpus = "\x00".join(lowered)
+        self._starts = list(accumulate((len(doc) + 1 for doc in lowered[:-1]), initial=0))
+
     def get_relevant_documents(self, query: str) -> List[MockDocument]:
-        # Simple keyword matching for demo
-        query_lower = query.lower()
-        relevant = [
-            MockDocument(doc) for doc in self.MOCK_DOCS
-            if any(word in doc.lower() for word in query_lower.split()[:5])
-        ]
-        return relevant[:5] if relevant else [MockDocument(self.MOCK_DOCS[0])]
+        # Simple keyword matching for demo: docs containing any of the
+        # first five query words, in order
+        words = query.lower().split()[:5]
+        hits: List[int] = []
+        if words:
+            pattern = re.compile("|".join(map(re.escape, words)))
+            match = pattern.search(self._corpus)
+            while match and len(hits) < 5:
+                i = bisect_right(self._starts, match.start()) - 1
+                hits.append(i)
+                if i + 1 == len(self._starts):
+                    break
+                match = pattern.search(self._corpus, self._starts[i + 1])
+        if not hits:
+            return [MockDocument(self.MOCK_DOCS[0])]
+        return [MockDocument(self.MOCK_DOCS[i]) for i in hits]
 
     def similarity_search(self, query: str, k: int = 5) -> List[MockDocument]:
         return self.get_relevant_documents(query)[:k]
 
 
+_MOCK_RETRIEVER = MockRetriever()
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     print("Testing retriever...")